@@ -12,23 +12,35 @@ import argparse
 import json
 import os
 import sys
-import urllib.request
-import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import ccxt
-import pandas as pd
 import requests
 from openai import OpenAI
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from utils.db import insert_sentiment
-
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+from utils.ohlcv_cache import get_ohlcv
+from utils.indicators import (
+    calculate_rsi,
+    calculate_macd,
+    calculate_stochastic,
+    calculate_bollinger,
+    calculate_obv,
+    calculate_atr,
+)
+from utils.news import get_news
+from utils.llm_cache import complete_json
+
+# Seconds before a single GPT request is abandoned
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 60))
+client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"), timeout=LLM_TIMEOUT)
 TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
 
 ALL_TIMEFRAMES = ['15m', '1h', '4h', '1d', '1w']
 DEFAULT_SYMBOLS = ['BTC/USDT']
+# Symbols analyzed at the same time (fetch + indicators + GPT)
+DEFAULT_CONCURRENCY = 4
 
 # How many candles to fetch per timeframe
 TF_LIMITS = {'15m': 250, '1h': 250, '4h': 250, '1d': 250, '1w': 156}
@@ -43,45 +55,6 @@ ASSET_NAMES = {
 # Technical Indicator Functions
 # ──────────────────────────────────────────────────────────────
 
-def calculate_rsi(series, period=14):
-    """RSI using Wilder's RMA (matches TradingView / industry standard)."""
-    delta = series.diff(1)
-    gain = delta.where(delta > 0, 0)
-    loss = -delta.where(delta < 0, 0)
-    avg_gain = gain.ewm(com=period - 1, min_periods=period).mean()
-    avg_loss = loss.ewm(com=period - 1, min_periods=period).mean()
-    rs = avg_gain / avg_loss
-    return 100 - (100 / (1 + rs))
-
-def calculate_macd(close, fast=12, slow=26, signal=9):
-    ema_fast = close.ewm(span=fast, adjust=False).mean()
-    ema_slow = close.ewm(span=slow, adjust=False).mean()
-    macd_line = ema_fast - ema_slow
-    signal_line = macd_line.ewm(span=signal, adjust=False).mean()
-    return macd_line, signal_line, macd_line - signal_line
-
-def calculate_stochastic(df, k_period=14, d_period=3):
-    low_min = df['low'].rolling(window=k_period).min()
-    high_max = df['high'].rolling(window=k_period).max()
-    k = 100 * (df['close'] - low_min) / (high_max - low_min)
-    return k, k.rolling(window=d_period).mean()
-
-def calculate_bollinger(close, period=20, std_dev=2):
-    sma = close.rolling(window=period).mean()
-    std = close.rolling(window=period).std()
-    return sma + (std * std_dev), sma, sma - (std * std_dev)
-
-def calculate_obv(close, volume):
-    obv = [0]
-    for i in range(1, len(close)):
-        if close.iloc[i] > close.iloc[i-1]:
-            obv.append(obv[-1] + volume.iloc[i])
-        elif close.iloc[i] < close.iloc[i-1]:
-            obv.append(obv[-1] - volume.iloc[i])
-        else:
-            obv.append(obv[-1])
-    return pd.Series(obv, index=close.index)
-
 def semaphore(indicator, value, **kw):
     price = kw.get('price', 0)
     if indicator in ('sma', 'ema'):
@@ -146,11 +119,7 @@ def build_indicators(df, price):
     }
 
     # ATR
-    high_low = df['high'] - df['low']
-    high_close = (df['high'] - close.shift()).abs()
-    low_close = (df['low'] - close.shift()).abs()
-    tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-    indicators['atr'] = {'value': round(tr.rolling(14).mean().iloc[-1], 2)}
+    indicators['atr'] = {'value': round(calculate_atr(df, period=14).iloc[-1], 2)}
 
     # OBV
     if 'volume' in df.columns and df['volume'].sum() > 0:
@@ -171,22 +140,9 @@ def build_indicators(df, price):
 
 
 # ──────────────────────────────────────────────────────────────
-# News
+# Telegram
 # ──────────────────────────────────────────────────────────────
 
-def get_news(query, limit=7):
-    try:
-        q = query.replace(' ', '+')
-        url = f"https://news.google.com/rss/search?q={q}+crypto+market&hl=en-US&gl=US&ceid=US:en"
-        req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-        xml_data = urllib.request.urlopen(req).read()
-        root = ET.fromstring(xml_data)
-        headlines = [item.find('title').text for item in root.findall('.//item')[:limit]]
-        return headlines if headlines else ["Sin noticias relevantes."]
-    except Exception:
-        return ["Error obteniendo noticias."]
-
-
 def send_telegram(text):
     if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
         print("⚠️ No Telegram credentials.")
@@ -199,52 +155,48 @@ def send_telegram(text):
 # Main Analysis
 # ──────────────────────────────────────────────────────────────
 
-def analyze(symbols, timeframes, send_tg=False, include_news=True):
-    exchange = ccxt.binance()
-    all_db_data = []
-
-    for symbol in symbols:
-        name = ASSET_NAMES.get(symbol, symbol.replace('/USDT', ''))
-        print(f"\n{'='*50}")
-        print(f"📊 Analyzing {name} ({symbol})")
-        print(f"{'='*50}")
-
-        # Fetch news once per symbol (shared across TFs)
-        news_text = ""
-        if include_news:
-            headlines = get_news(name)
-            news_text = '\n'.join([f"  - {h}" for h in headlines])
-
-        # Calculate indicators for each requested TF
-        tf_blocks = {}  # tf -> {price, indicators, tech_text}
-        for tf in timeframes:
-            try:
-                limit = TF_LIMITS.get(tf, 250)
-                bars = exchange.fetch_ohlcv(symbol, timeframe=tf, limit=limit)
-                df = pd.DataFrame(bars, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-                price = df['close'].iloc[-1]
-                indicators, tech_text = build_indicators(df, price)
-                tf_blocks[tf] = {'price': price, 'indicators': indicators, 'tech_text': tech_text}
-                print(f"  ✅ {tf}: {len(bars)} candles, price=${price:,.2f}")
-            except Exception as e:
-                print(f"  ❌ {tf}: {e}")
+def analyze_symbol(symbol, timeframes, send_tg=False, include_news=True):
+    """News + indicators for every TF + one GPT call for one symbol. Returns its DB rows."""
+    name = ASSET_NAMES.get(symbol, symbol.replace('/USDT', ''))
+    print(f"\n{'='*50}")
+    print(f"📊 Analyzing {name} ({symbol})")
+    print(f"{'='*50}")
+
+    # Fetch news once per symbol (shared across TFs)
+    news_text = ""
+    if include_news:
+        headlines = get_news(name)
+        news_text = '\n'.join([f"  - {h}" for h in headlines])
+
+    # Calculate indicators for each requested TF
+    tf_blocks = {}  # tf -> {price, indicators, tech_text}
+    for tf in timeframes:
+        try:
+            limit = TF_LIMITS.get(tf, 250)
+            df = get_ohlcv(symbol, tf, limit=limit)
+            price = df['close'].iloc[-1]
+            indicators, tech_text = build_indicators(df, price)
+            tf_blocks[tf] = {'price': price, 'indicators': indicators, 'tech_text': tech_text}
+            print(f"  ✅ {name} {tf}: {len(df)} candles, price=${price:,.2f}")
+        except Exception as e:
+            print(f"  ❌ {name} {tf}: {e}")
 
-        if not tf_blocks:
-            print(f"  ⚠️ No data for {name}, skipping.")
-            continue
+    if not tf_blocks:
+        print(f"  ⚠️ No data for {name}, skipping.")
+        return []
 
-        # ── Build ONE GPT prompt for all TFs ────────────────────────
-        context_parts = []
-        for tf, block in tf_blocks.items():
-            context_parts.append(
-                f"── {tf.upper()} (precio: ${block['price']:,.2f}) ──\n"
-                f"{block['tech_text']}"
-            )
+    # ── Build ONE GPT prompt for all TFs ────────────────────────
+    context_parts = []
+    for tf, block in tf_blocks.items():
+        context_parts.append(
+            f"── {tf.upper()} (precio: ${block['price']:,.2f}) ──\n"
+            f"{block['tech_text']}"
+        )
 
-        tf_context = '\n\n'.join(context_parts)
-        current_price = list(tf_blocks.values())[-1]['price']
+    tf_context = '\n\n'.join(context_parts)
+    current_price = list(tf_blocks.values())[-1]['price']
 
-        prompt = f"""
+    prompt = f"""
 Eres un analista cuantitativo institucional de ÉLITE. Analiza {name} (${current_price:,.2f}).
 
 {"📰 NOTICIAS:" + chr(10) + news_text + chr(10) if news_text else ""}
@@ -283,60 +235,76 @@ FORMATO JSON estricto:
 Repite la estructura para cada TF: {', '.join(tf_blocks.keys())}
 """
 
-        print(f"\n  🧠 Calling GPT-4o-mini (1 call for {len(tf_blocks)} TFs)...")
+    print(f"\n  🧠 Calling GPT-4o-mini (1 call for {len(tf_blocks)} TFs)...")
 
-        try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                response_format={"type": "json_object"},
-                temperature=0.1
-            )
-
-            result = json.loads(response.choices[0].message.content)
-
-            # Build Telegram message
-            tg_msg = f"📊 *{name}* — Análisis On-Demand\n\n"
-
-            for tf in tf_blocks:
-                datos = result.get(tf, {})
-                block = tf_blocks[tf]
-
-                emoji_comb = "🟢" if datos.get("sentiment_combined") == "Alcista" else "🔴" if datos.get("sentiment_combined") == "Bajista" else "🟡"
-                emoji_tech = "🟢" if datos.get("sentiment_technical") == "Alcista" else "🔴" if datos.get("sentiment_technical") == "Bajista" else "🟡"
-
-                tg_msg += f"*{tf.upper()}* {emoji_comb} {datos.get('sentiment_combined', '-')} ({datos.get('confidence_combined', '-')}%)\n"
-                tg_msg += f"  {emoji_tech} Tech: {datos.get('sentiment_technical', '-')} | 📰 News: {datos.get('sentiment_news', '-')}\n"
-                tg_msg += f"  _{datos.get('summary_combined', '')}_\n\n"
-
-                # Store each TF as separate row
-                all_db_data.append({
-                    "symbol": name,
-                    "timeframe": tf,
-                    # Combined = main
-                    "sentiment": datos.get('sentiment_combined', 'Neutral'),
-                    "confidence": int(datos.get('confidence_combined', 50)),
-                    "summary": datos.get('summary_combined', ''),
-                    # News
-                    "sentiment_news": datos.get('sentiment_news', 'Neutral'),
-                    "confidence_news": int(datos.get('confidence_news', 50)),
-                    "summary_news": datos.get('summary_news', ''),
-                    # Technical
-                    "sentiment_technical": datos.get('sentiment_technical', 'Neutral'),
-                    "confidence_technical": int(datos.get('confidence_technical', 50)),
-                    "summary_technical": datos.get('summary_technical', ''),
-                    # Semaphore
-                    "indicators": block['indicators'],
-                })
-
-            if send_tg:
-                send_telegram(tg_msg)
-                print("  📬 Telegram sent!")
-
-            print(f"  ✅ {name}: {len(tf_blocks)} TFs analyzed")
+    try:
+        # Unchanged indicators + headlines since a recent run → cached answer
+        llm_inputs = {'price': current_price, 'news': news_text, 'tfs': {tf: b['indicators'] for tf, b in tf_blocks.items()}}
+        content = complete_json(client, prompt, llm_inputs, model="gpt-4o-mini", temperature=0.1,
+                                timeout=LLM_TIMEOUT)
+
+        result = json.loads(content)
+        rows = []
+
+        # Build Telegram message
+        tg_msg = f"📊 *{name}* — Análisis On-Demand\n\n"
+
+        for tf in tf_blocks:
+            datos = result.get(tf, {})
+            block = tf_blocks[tf]
+
+            emoji_comb = "🟢" if datos.get("sentiment_combined") == "Alcista" else "🔴" if datos.get("sentiment_combined") == "Bajista" else "🟡"
+            emoji_tech = "🟢" if datos.get("sentiment_technical") == "Alcista" else "🔴" if datos.get("sentiment_technical") == "Bajista" else "🟡"
+
+            tg_msg += f"*{tf.upper()}* {emoji_comb} {datos.get('sentiment_combined', '-')} ({datos.get('confidence_combined', '-')}%)\n"
+            tg_msg += f"  {emoji_tech} Tech: {datos.get('sentiment_technical', '-')} | 📰 News: {datos.get('sentiment_news', '-')}\n"
+            tg_msg += f"  _{datos.get('summary_combined', '')}_\n\n"
+
+            # Store each TF as separate row
+            rows.append({
+                "symbol": name,
+                "timeframe": tf,
+                # Combined = main
+                "sentiment": datos.get('sentiment_combined', 'Neutral'),
+                "confidence": int(datos.get('confidence_combined', 50)),
+                "summary": datos.get('summary_combined', ''),
+                # News
+                "sentiment_news": datos.get('sentiment_news', 'Neutral'),
+                "confidence_news": int(datos.get('confidence_news', 50)),
+                "summary_news": datos.get('summary_news', ''),
+                # Technical
+                "sentiment_technical": datos.get('sentiment_technical', 'Neutral'),
+                "confidence_technical": int(datos.get('confidence_technical', 50)),
+                "summary_technical": datos.get('summary_technical', ''),
+                # Semaphore
+                "indicators": block['indicators'],
+            })
+
+        if send_tg:
+            send_telegram(tg_msg)
+            print("  📬 Telegram sent!")
+
+        print(f"  ✅ {name}: {len(tf_blocks)} TFs analyzed")
+
+    except Exception as e:
+        print(f"  ❌ GPT error for {name}: {e}")
+        return []
+
+    return rows
+
+
+def analyze(symbols, timeframes, send_tg=False, include_news=True, concurrency=DEFAULT_CONCURRENCY):
+    """Analyze `symbols` concurrently (at most `concurrency` at once) and store one batch."""
+    all_db_data = []
 
-        except Exception as e:
-            print(f"  ❌ GPT error for {name}: {e}")
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(symbols)))) as pool:
+        futures = {pool.submit(analyze_symbol, symbol, timeframes, send_tg, include_news): symbol
+                   for symbol in symbols}
+        for future in as_completed(futures):
+            try:
+                all_db_data.extend(future.result())
+            except Exception as e:
+                print(f"  ❌ Error analyzing {futures[future]}: {e}")
 
     # Insert all rows at once
     if all_db_data:
@@ -369,6 +337,8 @@ Examples:
                         help='Send results to Telegram')
     parser.add_argument('--no-news', action='store_true',
                         help='Skip news fetching (technical only)')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'Symbols analyzed in parallel (default: {DEFAULT_CONCURRENCY})')
 
     args = parser.parse_args()
 
@@ -387,7 +357,8 @@ Examples:
     print(f"   Telegram:   {'✅' if args.telegram else '❌'}")
     print(f"   News:       {'❌ Skipped' if args.no_news else '✅'}")
 
-    analyze(symbols, timeframes, send_tg=args.telegram, include_news=not args.no_news)
+    analyze(symbols, timeframes, send_tg=args.telegram, include_news=not args.no_news,
+            concurrency=args.concurrency)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+columnar.py — Formato binario columnar (.npy) para los datasets de backtesting.
+
+Por cada TF se guardan dos archivos junto a meta.json:
+  {tf}.timestamp.{gen}.npy  → datetime64[ns] (1 columna)
+  {tf}.ohlcv.{gen}.npy      → float64 de forma (5, n): open, high, low, close, volume
+
+Cada fila del array 2D es una columna contigua en disco, así que el engine
+puede abrirlos con np.load(mmap_mode='r') y envolverlos en un DataFrame sin
+copiar: varios procesos del API comparten las mismas páginas del SO.
+El manifest `columns.json` describe los archivos y el número de velas.
+
+Los archivos nunca se reescriben en el lugar: cada escritura crea una nueva
+generación `{gen}` (tmp + rename) y cambia el manifest de forma atómica, así
+un proceso que tiene mapeada la versión anterior sigue leyéndola intacta.
+
+Uso (conversión one-shot de datasets CSV existentes):
+    python columnar.py                  # Convierte todos los datasets en data/
+    python columnar.py BTCUSDT_30d      # Convierte sólo ese dataset
+"""
+
+import os
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+MANIFEST_FILE = 'columns.json'
+FORMAT_VERSION = 1
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+def _read_manifest(dataset_dir):
+    path = os.path.join(dataset_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_manifest(dataset_dir, manifest):
+    path = os.path.join(dataset_dir, MANIFEST_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _save_npy(dataset_dir, name, values):
+    """np.save to a temp file in `dataset_dir`, then rename it into place."""
+    path = os.path.join(dataset_dir, name)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, values)
+    os.replace(tmp_path, path)
+
+
+def _remove_stale(dataset_dir, tf, keep):
+    """Delete the TF's .npy generations other than `keep` (file names)."""
+    for name in os.listdir(dataset_dir):
+        if name.startswith(f"{tf}.") and name.endswith('.npy') and name not in keep:
+            try:
+                os.remove(os.path.join(dataset_dir, name))
+            except OSError:
+                pass
+
+
+def has_columnar(dataset_dir, tf):
+    manifest = _read_manifest(dataset_dir)
+    return bool(manifest) and tf in manifest.get('timeframes', {})
+
+
+def write_columnar(df, dataset_dir, tf):
+    """
+    Store one TF DataFrame (timestamp in ms or datetime) as .npy columns.
+    Writes a new file generation and then switches the manifest, so readers
+    with the previous files memory-mapped are never truncated under them.
+    """
+    timestamps = df['timestamp']
+    if not pd.api.types.is_datetime64_any_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps, unit='ms')
+    ts_values = timestamps.to_numpy().astype('datetime64[ns]')
+    prices = np.ascontiguousarray(df[PRICE_COLUMNS].to_numpy(dtype=np.float64).T)
+
+    generation = time.time_ns()
+    ts_file = f"{tf}.timestamp.{generation}.npy"
+    ohlcv_file = f"{tf}.ohlcv.{generation}.npy"
+    _save_npy(dataset_dir, ts_file, ts_values)
+    _save_npy(dataset_dir, ohlcv_file, prices)
+
+    manifest = _read_manifest(dataset_dir) or {'format': 'npy-columnar', 'version': FORMAT_VERSION, 'timeframes': {}}
+    previous = manifest['timeframes'].get(tf, {})
+    manifest['timeframes'][tf] = {
+        'rows': int(len(ts_values)),
+        'timestamp_file': ts_file,
+        'ohlcv_file': ohlcv_file,
+        'columns': PRICE_COLUMNS,
+    }
+    _write_manifest(dataset_dir, manifest)
+    # Keep the previous generation for readers that loaded the old manifest
+    _remove_stale(dataset_dir, tf, {ts_file, ohlcv_file,
+                                    previous.get('timestamp_file'), previous.get('ohlcv_file')})
+
+
+def load_columnar(dataset_dir, tf, mmap=True):
+    """
+    Open a TF as a DataFrame backed directly by the .npy files.
+    With mmap=True the arrays are read-only memory maps (zero copies), so
+    the frame is read-only too: in-place writes such as df.loc[...] = x
+    raise "assignment destination is read-only". Adding new columns is fine;
+    copy the frame (or pass mmap=False) to modify existing values.
+    """
+    manifest = _read_manifest(dataset_dir)
+    entry = manifest['timeframes'][tf]
+    mode = 'r' if mmap else None
+    ts_values = np.load(os.path.join(dataset_dir, entry['timestamp_file']), mmap_mode=mode)
+    prices = np.load(os.path.join(dataset_dir, entry['ohlcv_file']), mmap_mode=mode)
+
+    # prices.T is a Fortran-ordered view, which pandas keeps as a single block
+    df = pd.DataFrame(prices.T, columns=entry['columns'], copy=False)
+    df.insert(0, 'timestamp', pd.Series(ts_values, copy=False))
+    return df
+
+
+def convert_dataset(dataset_dir, timeframes=('15m', '1h', '4h', '1d', '1w')):
+    """Convert every `{tf}.csv` of a dataset directory to the columnar format."""
+    converted = []
+    for tf in timeframes:
+        csv_path = os.path.join(dataset_dir, f"{tf}.csv")
+        if not os.path.exists(csv_path):
+            continue
+        df = pd.read_csv(csv_path)
+        write_columnar(df, dataset_dir, tf)
+        converted.append(tf)
+    return converted
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convertir datasets CSV al formato columnar .npy')
+    parser.add_argument('datasets', nargs='*', help='Nombres de dataset en data/ (default: todos)')
+    args = parser.parse_args()
+
+    names = args.datasets or sorted(
+        n for n in os.listdir(DATA_DIR) if os.path.isdir(os.path.join(DATA_DIR, n)))
+
+    for name in names:
+        dataset_dir = os.path.join(DATA_DIR, name)
+        if not os.path.isdir(dataset_dir):
+            print(f"   ⚠️ {name}: directorio no encontrado")
+            continue
+        converted = convert_dataset(dataset_dir)
+        if converted:
+            print(f"   ✅ {name}: {', '.join(converted)} → {MANIFEST_FILE}")
+        else:
+            print(f"   ⚠️ {name}: sin CSVs para convertir")
+
+
+if __name__ == '__main__':
+    main()
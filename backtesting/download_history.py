@@ -6,18 +6,46 @@ Un solo comando descarga TODAS las temporalidades (15m, 1h, 4h, 1d, 1w)
 con sizing inteligente: TFs altos siempre descargan 500 velas,
 TFs bajos descargan 500 warmup + velas de simulación.
 
+Con --update se reutiliza el dataset existente: por cada TF se descarga
+sólo desde la última vela guardada, se rellenan huecos internos y se
+eliminan velas duplicadas; meta.json se reescribe de forma atómica.
+Los huecos que el exchange confirma vacíos (p. ej. mantenimientos de
+Binance) quedan en meta.json['exchange_gaps'] y no se vuelven a pedir; un
+hueco cuya descarga falló (429, timeout, error de red) no se confirma y se
+vuelve a pedir en la siguiente corrida.
+
+Con --derive-from 15m (o 1m) sólo se descarga la serie base y las TFs altas
+se construyen localmente (resample.py) con los mismos límites de vela que
+Binance; únicamente el warmup anterior a la base se pide nativo y una muestra
+de velas derivadas se contrasta contra las del exchange.
+
+Varios símbolos se descargan en paralelo (un hilo por símbolo) y el ritmo
+de requests lo marca un token bucket ajustado al presupuesto de weight de
+Binance, no sleeps fijos.
+
 Uso:
     python download_history.py --symbol BTC/USDT --days 30
+    python download_history.py --symbol BTC/USDT --days 30 --update
+    python download_history.py --symbols BTC/USDT ETH/USDT SOL/USDT --days 30 --workers 8
+    python download_history.py --symbol BTC/USDT --days 30 --derive-from 15m
 """
 
 import os
+import sys
 import json
-import time
 import argparse
-import ccxt
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 
+# Add parent dir for shared utils
+PARENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PARENT_DIR)
+
+from columnar import write_columnar, has_columnar, load_columnar
+from resample import resample_ohlcv, compare_with_native, bucket_starts
+from utils.market_data import get_market_data_client
+
 DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
 
 # Timeframes to download and their candle-per-day ratios
@@ -31,6 +59,7 @@ TIMEFRAMES = {
 
 # TF duration in milliseconds (for pagination)
 TF_MS = {
+    '1m':  60 * 1000,
     '15m': 15 * 60 * 1000,
     '1h':  60 * 60 * 1000,
     '4h':  4 * 60 * 60 * 1000,
@@ -39,60 +68,243 @@ TF_MS = {
 }
 
 
-def download_tf(exchange, symbol, timeframe, num_candles):
-    """Download up to num_candles for a given TF with pagination."""
+class FetchError(Exception):
+    """A paginated download stopped on a request error; `bars` holds what arrived before it."""
+
+    def __init__(self, message, bars):
+        super().__init__(message)
+        self.bars = bars
+
+
+def fetch_range(exchange, symbol, timeframe, since, until=None, max_candles=None):
+    """
+    Paginate fetch_ohlcv from `since` (inclusive) until `until` (exclusive) or now.
+    Raises FetchError (with the bars downloaded so far) if a request fails, so
+    an incomplete range is never mistaken for one the exchange has no bars for.
+    """
     all_data = []
     tf_ms = TF_MS[timeframe]
-    now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
-    since = now_ms - (num_candles * tf_ms)
     limit_per_req = 1000  # Binance max
 
-    while len(all_data) < num_candles:
+    while max_candles is None or len(all_data) < max_candles:
+        if until is not None and since >= until:
+            break
         try:
+            # Weight budget, pacing and retries live in the shared MarketDataClient
             ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=limit_per_req)
-            if not ohlcv:
-                break
-            all_data.extend(ohlcv)
-            since = ohlcv[-1][0] + tf_ms
-            if len(ohlcv) < limit_per_req:
-                break
-            time.sleep(0.3)
         except Exception as e:
-            print(f"      ⚠️ Error descargando {timeframe}: {e}")
+            print(f"      ⚠️ Error descargando {symbol} {timeframe}: {e}")
+            raise FetchError(str(e), clip_until(all_data, until)) from e
+        if not ohlcv:
             break
+        all_data.extend(ohlcv)
+        since = ohlcv[-1][0] + tf_ms
+        if len(ohlcv) < limit_per_req:
+            break
+
+    return clip_until(all_data, until)
+
+
+def clip_until(bars, until):
+    return bars if until is None else [bar for bar in bars if bar[0] < until]
+
+
+def fetch_partial(exchange, symbol, timeframe, since, **kwargs):
+    """fetch_range that keeps whatever arrived before a request error."""
+    try:
+        return fetch_range(exchange, symbol, timeframe, since, **kwargs)
+    except FetchError as e:
+        return e.bars
+
 
+def to_frame(bars):
+    df = pd.DataFrame(bars, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    # keep='last' so a re-downloaded (previously forming) candle wins
+    df = df.drop_duplicates(subset='timestamp', keep='last').sort_values('timestamp').reset_index(drop=True)
+    return df
+
+
+def download_tf(exchange, symbol, timeframe, num_candles):
+    """Download up to num_candles for a given TF with pagination."""
+    tf_ms = TF_MS[timeframe]
+    now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+    since = now_ms - (num_candles * tf_ms)
+
+    all_data = fetch_partial(exchange, symbol, timeframe, since, max_candles=num_candles)
     if not all_data:
         return None
+    return to_frame(all_data)
 
-    df = pd.DataFrame(all_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df = df.drop_duplicates(subset='timestamp').sort_values('timestamp').reset_index(drop=True)
-    return df
 
+def find_gaps(timestamps, tf_ms):
+    """Return [(first_missing_ts, next_present_ts), ...] for interior holes."""
+    ts = timestamps.to_numpy()
+    steps = ts[1:] - ts[:-1]
+    holes = (steps > tf_ms).nonzero()[0]
+    return [(int(ts[i]) + tf_ms, int(ts[i + 1])) for i in holes]
 
-def main():
-    parser = argparse.ArgumentParser(description='Descargar datasets multi-TF para backtesting')
-    parser.add_argument('--symbol', default='BTC/USDT', help='Par de trading')
-    parser.add_argument('--days', type=int, default=30, help='Días de simulación')
-    args = parser.parse_args()
 
-    symbol = args.symbol
-    days = args.days
-    safe_symbol = symbol.replace('/', '')
+def within(gap, ranges):
+    """Whether `gap` lies inside one of the [start, end) `ranges`."""
+    return any(start <= gap[0] and gap[1] <= end for start, end in ranges)
+
+
+def load_existing_tf(dataset_dir, timeframe):
+    """Read a stored TF back as a DataFrame with millisecond timestamps."""
+    filepath = os.path.join(dataset_dir, f"{timeframe}.csv")
+    if os.path.exists(filepath):
+        return pd.read_csv(filepath)
+    if has_columnar(dataset_dir, timeframe):
+        df = load_columnar(dataset_dir, timeframe, mmap=False)
+        df['timestamp'] = df['timestamp'].astype('int64') // 10**6
+        return df
+    return None
+
+
+def update_tf(exchange, symbol, timeframe, existing, num_candles, known_gaps=()):
+    """
+    Bring a stored TF up to date: re-download from the last stored candle
+    (it may have been still forming), backfill interior gaps and drop
+    duplicate bars. Gaps in `known_gaps` are already confirmed empty on the
+    exchange and are not requested again. Returns (df, stats); stats['holes']
+    lists the gaps the exchange confirmed empty (a backfill that came back
+    short), leaving out any inside a range whose download failed.
+    """
+    tf_ms = TF_MS[timeframe]
+    existing = existing.drop_duplicates(subset='timestamp', keep='last').sort_values('timestamp')
+    last_ts = int(existing['timestamp'].iloc[-1])
 
-    # Create dataset directory
+    # A failed tail only truncates the series, it leaves no interior hole
+    tail = fetch_partial(exchange, symbol, timeframe, since=last_ts)
+    known = {tuple(gap) for gap in known_gaps}
+    gaps = [gap for gap in find_gaps(existing['timestamp'], tf_ms) if gap not in known]
+    backfill = []
+    failed = []
+    for gap_start, gap_end in gaps:
+        try:
+            backfill.extend(fetch_range(exchange, symbol, timeframe, since=gap_start, until=gap_end))
+        except FetchError as e:
+            backfill.extend(e.bars)
+            failed.append((gap_start, gap_end))
+
+    fetched = to_frame(backfill + tail)
+    merged = pd.concat([existing, fetched], ignore_index=True)
+    merged = merged.drop_duplicates(subset='timestamp', keep='last').sort_values('timestamp')
+    merged = merged.iloc[-num_candles:].reset_index(drop=True)
+
+    holes = [gap for gap in find_gaps(merged['timestamp'], tf_ms) if not within(gap, failed)]
+    stats = {'new': int((fetched['timestamp'] > last_ts).sum()), 'gaps': len(gaps), 'backfilled': len(backfill),
+             'failed': len(failed), 'holes': holes}
+    return merged, stats
+
+
+def fetch_base(exchange, symbol, base_tf, since):
+    """Download the base series used to derive higher TFs."""
+    return to_frame(fetch_partial(exchange, symbol, base_tf, since=since))
+
+
+def derive_tf(exchange, symbol, timeframe, base_df, existing, num_candles, verify=0):
+    """
+    Build `timeframe` by resampling the base series. Only the warmup that
+    predates the base series is downloaded natively (or kept from `existing`),
+    and the last `verify` closed derived bars are checked against native ones.
+    """
+    tf_ms = TF_MS[timeframe]
+    derived = resample_ohlcv(base_df, tf_ms)
+    if len(derived) == 0:
+        return download_tf(exchange, symbol, timeframe, num_candles), {'derived': 0, 'native': num_candles, 'check': None}
+
+    first_ts = int(derived['timestamp'].iloc[0])
+    native = 0
+    if existing is not None and len(existing) > 0:
+        older = existing
+    else:
+        missing = num_candles - len(derived)
+        prefix = fetch_partial(exchange, symbol, timeframe, since=first_ts - missing * tf_ms, until=first_ts) if missing > 0 else []
+        native = len(prefix)
+        older = to_frame(prefix)
+
+    # Derived bars overwrite older copies of the same bucket
+    merged = pd.concat([older, derived], ignore_index=True)
+    merged = merged.drop_duplicates(subset='timestamp', keep='last').sort_values('timestamp')
+    merged['timestamp'] = merged['timestamp'].astype('int64')
+    merged = merged.iloc[-num_candles:].reset_index(drop=True)
+
+    check = None
+    closed = derived.iloc[:-1].tail(verify)
+    if verify and len(closed) > 0:
+        sample = to_frame(fetch_partial(exchange, symbol, timeframe, since=int(closed['timestamp'].iloc[0]),
+                                        max_candles=len(closed)))
+        check = compare_with_native(closed, sample)
+    return merged, {'derived': len(derived), 'native': native, 'check': check}
+
+
+def save_tf(df, dataset_dir, timeframe):
+    """Write one TF as CSV + columnar and return its meta.json entry."""
+    filepath = os.path.join(dataset_dir, f"{timeframe}.csv")
+    df.to_csv(filepath, index=False)
+    write_columnar(df, dataset_dir, timeframe)
+
+    return {
+        'candles': len(df),
+        'start': pd.to_datetime(df['timestamp'].iloc[0], unit='ms').strftime('%Y-%m-%d'),
+        'end': pd.to_datetime(df['timestamp'].iloc[-1], unit='ms').strftime('%Y-%m-%d')
+    }
+
+
+def write_meta(dataset_dir, meta):
+    """Write meta.json atomically (tmp file + rename)."""
+    meta_path = os.path.join(dataset_dir, 'meta.json')
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, meta_path)
+
+
+def build_dataset(exchange, symbol, days, update=False, derive_from=None, verify=0):
+    """
+    Download (or update) every TF of one symbol's dataset. Returns log lines.
+    With derive_from ('15m' or '1m') only that base series is downloaded in
+    full and every higher TF is resampled from it.
+    """
+    safe_symbol = symbol.replace('/', '')
     dataset_dir = os.path.join(DATA_DIR, f"{safe_symbol}_{days}d")
     os.makedirs(dataset_dir, exist_ok=True)
 
-    exchange = ccxt.binance({'enableRateLimit': True})
-
-    print(f"\n📥 Descargando dataset multi-TF para {symbol} — {days} días de simulación\n")
+    meta_path = os.path.join(dataset_dir, 'meta.json')
+    old_meta = {}
+    if update and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            old_meta = json.load(f)
 
     meta = {
         'symbol': symbol,
         'days': days,
         'timeframes': {},
-        'downloaded_at': datetime.now(timezone.utc).isoformat()
+        'downloaded_at': old_meta.get('downloaded_at', datetime.now(timezone.utc).isoformat()),
+        # {tf: [[first_missing_ts, next_present_ts], ...]} the exchange has no bars for
+        'exchange_gaps': {},
     }
+    if update:
+        meta['updated_at'] = datetime.now(timezone.utc).isoformat()
+
+    lines = []
+    base_df = None
+    stored = {tf: load_existing_tf(dataset_dir, tf) for tf in TIMEFRAMES} if update else {}
+    if derive_from and derive_from not in TIMEFRAMES:
+        # Sub-clock base (1m): cover the clock TF's span, or just its stale tail.
+        # The tail starts at the bucket of the oldest last stored bar across the
+        # derived TFs, so every bar that was still forming is rebuilt whole
+        clock = TIMEFRAMES['15m']
+        clock_candles = clock['min_download'] + int(days * clock['candles_per_day'])
+        seams = [int(bucket_starts([df['timestamp'].iloc[-1]], TF_MS[tf])[0])
+                 for tf, df in stored.items() if df is not None and len(df) > 0]
+        if seams:
+            since = min(seams)
+        else:
+            since = int(datetime.now(timezone.utc).timestamp() * 1000) - clock_candles * TF_MS['15m']
+        base_df = fetch_base(exchange, symbol, derive_from, since)
+        lines.append(f"   📥 base {derive_from}: {len(base_df)} velas")
 
     for tf, cfg in TIMEFRAMES.items():
         # Calculate candles needed: warmup + simulation candles
@@ -100,36 +312,84 @@ def main():
         warmup = cfg['min_download']
         total_candles = warmup + sim_candles
 
-        print(f"   📊 {tf:>3s}: descargando ~{total_candles} velas ({warmup} warmup + {sim_candles} sim)...", end=' ')
+        existing = stored.get(tf)
+
+        if base_df is not None and TF_MS[tf] > TF_MS[derive_from]:
+            df, stats = derive_tf(exchange, symbol, tf, base_df, existing, total_candles, verify)
+            detail = f"🧮 {stats['derived']} derivadas de {derive_from}"
+            if stats['native']:
+                detail += f" + {stats['native']} nativas (warmup)"
+            if stats['check']:
+                bad = stats['check']['mismatches']
+                detail += (f" | ✔️ {stats['check']['compared']} verificadas" if not bad
+                           else f" | ⚠️ {len(bad)}/{stats['check']['compared']} difieren del exchange")
+        elif existing is not None and len(existing) > 0:
+            known_gaps = old_meta.get('exchange_gaps', {}).get(tf, [])
+            df, stats = update_tf(exchange, symbol, tf, existing, total_candles, known_gaps)
+            meta['exchange_gaps'][tf] = stats['holes']
+            detail = f"🔄 +{stats['new']} nuevas"
+            if stats['gaps']:
+                detail += f", {stats['gaps']} huecos ({stats['backfilled']} velas rellenadas)"
+            if stats['failed']:
+                detail += f" | ⚠️ {stats['failed']} huecos sin confirmar (se reintentan)"
+        else:
+            df = download_tf(exchange, symbol, tf, total_candles)
+            detail = f"📊 {warmup} warmup + {sim_candles} sim"
+            if df is not None and len(df) > 0:
+                # Holes in a fresh download are the exchange's own: a failed
+                # request ends the pagination, so it never leaves one inside
+                meta['exchange_gaps'][tf] = find_gaps(df['timestamp'], TF_MS[tf])
 
-        df = download_tf(exchange, symbol, tf, total_candles)
+        if tf == derive_from:
+            base_df = df
 
         if df is not None and len(df) > 0:
-            filepath = os.path.join(dataset_dir, f"{tf}.csv")
-            df.to_csv(filepath, index=False)
-
-            start_date = pd.to_datetime(df['timestamp'].iloc[0], unit='ms').strftime('%Y-%m-%d')
-            end_date = pd.to_datetime(df['timestamp'].iloc[-1], unit='ms').strftime('%Y-%m-%d')
-
-            meta['timeframes'][tf] = {
-                'candles': len(df),
-                'start': start_date,
-                'end': end_date
-            }
-            print(f"✅ {len(df)} velas ({start_date} → {end_date})")
+            meta['timeframes'][tf] = save_tf(df, dataset_dir, tf)
+            tf_meta = meta['timeframes'][tf]
+            lines.append(f"   ✅ {tf:>3s}: {len(df)} velas ({tf_meta['start']} → {tf_meta['end']}) | {detail}")
         else:
-            print(f"❌ Sin datos")
-
-        time.sleep(0.5)
+            lines.append(f"   ❌ {tf:>3s}: Sin datos")
 
     # Save metadata
-    meta_path = os.path.join(dataset_dir, 'meta.json')
-    with open(meta_path, 'w') as f:
-        json.dump(meta, f, indent=2)
+    write_meta(dataset_dir, meta)
+    lines.append(f"   📁 {dataset_dir} (meta.json, columns.json)")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Descargar datasets multi-TF para backtesting')
+    parser.add_argument('--symbols', '--symbol', nargs='+', default=['BTC/USDT'], dest='symbols',
+                        help='Pares de trading, ej: BTC/USDT ETH/USDT SOL/USDT')
+    parser.add_argument('--days', type=int, default=30, help='Días de simulación')
+    parser.add_argument('--update', action='store_true',
+                        help='Actualiza datasets existentes descargando sólo las velas que faltan')
+    parser.add_argument('--workers', type=int, default=8, help='Símbolos descargados en paralelo')
+    parser.add_argument('--derive-from', choices=['15m', '1m'], default=None,
+                        help='Descarga sólo esta TF base y deriva las TFs altas localmente')
+    parser.add_argument('--verify', type=int, default=20,
+                        help='Velas derivadas a contrastar con las nativas del exchange (0 = no verificar)')
+    args = parser.parse_args()
+
+    exchange = get_market_data_client()
+    exchange.load_markets()
+
+    action = '🔄 Actualizando' if args.update else '📥 Descargando'
+    print(f"\n{action} {len(args.symbols)} dataset(s) multi-TF — {args.days} días de simulación "
+          f"({args.workers} workers)\n")
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(build_dataset, exchange, symbol, args.days, args.update,
+                               args.derive_from, args.verify): symbol
+                   for symbol in args.symbols}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                lines = future.result()
+                print(f"📦 {symbol}\n" + '\n'.join(lines) + '\n')
+            except Exception as e:
+                print(f"❌ {symbol}: {e}\n")
 
-    print(f"\n✅ Dataset completo guardado en: {dataset_dir}")
-    print(f"   Archivos: {', '.join(tf + '.csv' for tf in meta['timeframes'])}")
-    print(f"   Meta: meta.json\n")
+    print(f"✅ Datasets completos guardados en: {DATA_DIR}\n")
 
 
 if __name__ == '__main__':
@@ -2,14 +2,10 @@ import pandas as pd
 import numpy as np
 import logging
 
+from utils.indicators import calculate_atr
+
 logger = logging.getLogger(__name__)
 
-def calc_atr(df, period=14):
-    high_low = df['high'] - df['low']
-    high_close = (df['high'] - df['close'].shift()).abs()
-    low_close = (df['low'] - df['close'].shift()).abs()
-    tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-    return tr.rolling(window=period).mean()
 
 def get_adaptive_zigzag(df, atr_multiplier=1.5):
     """
@@ -21,7 +17,7 @@ def get_adaptive_zigzag(df, atr_multiplier=1.5):
         
     df = df.copy()
     if 'atr' not in df.columns:
-        df['atr'] = calc_atr(df)
+        df['atr'] = calculate_atr(df)
         
     df['atr'] = df['atr'].bfill()
     
@@ -25,9 +25,12 @@ from datetime import datetime
 PARENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, PARENT_DIR)
 
-from sr_scanner import get_fractal_extremes, cluster_levels, calculate_atr_pct
-from smc_scanner import find_unmitigated_fvgs
-from rsi_divergence import check_divergences
+from sr_scanner import get_fractal_extremes, cluster_levels
+from smc_scanner import find_unmitigated_fvgs, detect_fvgs
+from rsi_divergence import check_divergences, divergence_rows
+from utils.indicators import calculate_atr_pct, calculate_rsi, add_indicator_columns
+from utils.pivots import PivotTimeline
+from columnar import has_columnar, load_columnar
 
 # ──────────────────────────────────────────────────────────────
 # Constants
@@ -67,7 +70,11 @@ TF_RANK = {'15m': 0, '1h': 1, '4h': 2, '1d': 3, '1w': 4}
 # ──────────────────────────────────────────────────────────────
 
 def load_multi_tf_data(dataset_dir):
-    """Load all TF CSVs from a dataset directory."""
+    """
+    Load all TFs from a dataset directory (columnar .npy if available, else
+    CSV) and precompute the causal `rsi` / `atr` columns once, so every
+    scan slice already carries them.
+    """
     datasets = {}
     meta_path = os.path.join(dataset_dir, 'meta.json')
 
@@ -79,7 +86,12 @@ def load_multi_tf_data(dataset_dir):
 
     for tf in ORDER_MAP.keys():
         filepath = os.path.join(dataset_dir, f"{tf}.csv")
-        if os.path.exists(filepath):
+        if has_columnar(dataset_dir, tf):
+            # Memory-mapped .npy columns: no parsing, no copies
+            df = load_columnar(dataset_dir, tf)
+            datasets[tf] = df
+            print(f"   ✅ {tf}: {len(df)} velas cargadas (columnar)")
+        elif os.path.exists(filepath):
             df = pd.read_csv(filepath)
             df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
             datasets[tf] = df
@@ -87,6 +99,9 @@ def load_multi_tf_data(dataset_dir):
         else:
             print(f"   ⚠️ {tf}: archivo no encontrado")
 
+    for df in datasets.values():
+        add_indicator_columns(df)
+
     return datasets, meta
 
 
@@ -101,20 +116,146 @@ def get_tf_slice(df, current_time):
     return df.iloc[:idx]
 
 
+# ──────────────────────────────────────────────────────────────
+# Multi-TF As-Of Alignment
+# ──────────────────────────────────────────────────────────────
+
+def build_tf_alignment(datasets, clock_tf):
+    """
+    For every clock candle i, how many candles of each TF have already
+    closed when candle i closes: {tf: int array of len(clock)}.
+    Timestamps are open times, so a TF candle counts once
+    open + TF_MS[tf] <= clock open + TF_MS[clock_tf]; higher-TF candles
+    still forming at that point are left out of the scan.
+    """
+    clock_ts = datasets[clock_tf]['timestamp'].values
+    clock_close = clock_ts + np.timedelta64(TF_MS[clock_tf], 'ms')
+    alignment = {}
+    for tf, df in datasets.items():
+        close_ts = df['timestamp'].values + np.timedelta64(TF_MS[tf], 'ms')
+        alignment[tf] = np.searchsorted(close_ts, clock_close, side='right')
+    return alignment
+
+
+def aligned_slices(datasets, alignment, i):
+    """Closed-candle prefix of every TF at clock candle `i`, sliced once per scan."""
+    return {tf: df.iloc[:int(alignment[tf][i])] for tf, df in datasets.items()}
+
+
+def closed_slice(df, tf, current_time, slices=None):
+    """Candles of `tf` visible at `current_time`: the shared as-of prefix when `slices` is given."""
+    if slices is not None:
+        return slices[tf]
+    return get_tf_slice(df, current_time)
+
+
+# ──────────────────────────────────────────────────────────────
+# Pivot Timeline Index
+# ──────────────────────────────────────────────────────────────
+
+def build_pivot_index(datasets):
+    """
+    Fractal pivots of every TF computed once over the full dataset, each
+    with the timestamp of the bar that confirms it (see PivotTimeline):
+      'sr'  → pivots of the raw candles, as get_fractal_extremes sees them
+      'rsi' → pivots of the candles left after check_divergences drops the
+              RSI warmup rows, mapped back to positions in the TF frame
+    A scan at time t then asks for the visible pivots with a binary search
+    instead of rerunning argrelextrema over the growing slice.
+    """
+    index = {'sr': {}, 'rsi': {}}
+    for tf, df in datasets.items():
+        ts = df['timestamp'].values
+        index['sr'][tf] = PivotTimeline(df['high'], df['low'], ts, ORDER_MAP.get(tf, 10))
+
+        # RSI is causal: the rows kept on any slice are a prefix of these
+        rsi = df['rsi'] if 'rsi' in df.columns else calculate_rsi(df['close'])
+        positions = np.flatnonzero(divergence_rows(df, rsi))
+        index['rsi'][tf] = PivotTimeline(df['high'].values[positions], df['low'].values[positions],
+                                         ts[positions], ORDER_MAP.get(tf, 5), positions=positions)
+    return index
+
+
+# ──────────────────────────────────────────────────────────────
+# FVG Lifetime Index
+# ──────────────────────────────────────────────────────────────
+
+def first_reach(values, start, threshold, reached, extreme):
+    """
+    For every query, the first index j >= start[q] where
+    reached(values[j], threshold[q]) holds (len(values) if none).
+    Binary lifting over a sparse table of block extremes (`extreme`,
+    np.fmin or np.fmax): whole blocks that cannot reach the threshold are
+    skipped, largest first. O(n log n) build, O(log n) per query.
+    """
+    n = len(values)
+    pos = np.asarray(start, dtype=np.int64).copy()
+    levels = [values]
+    while 2 ** len(levels) <= n:
+        prev, half = levels[-1], 2 ** (len(levels) - 1)
+        levels.append(extreme(prev[:-half], prev[half:]))
+
+    for p in range(len(levels) - 1, -1, -1):
+        step = 2 ** p
+        can = pos + step <= n
+        block = levels[p][np.where(can, pos, 0)]
+        pos += np.where(can & ~reached(block, threshold), step, 0)
+    return pos
+
+
+class FVGLifetimeIndex:
+    """
+    Every FVG of one TF with its lifetime over the full series: formed_at
+    (index of candle 3) and mitigated_at (first later candle that fills it,
+    len(df) if never). The gap is open for prefixes of length L with
+    formed_at < L <= mitigated_at, so "unmitigated at t" is a stabbing
+    query on those intervals.
+    """
+
+    def __init__(self, df):
+        high = df['high'].to_numpy(dtype=np.float64)
+        low = df['low'].to_numpy(dtype=np.float64)
+        self.timestamps = df['timestamp'].values
+        self.formed_at, self.is_bull, self.top, self.bottom = detect_fvgs(high, low)
+
+        # Bullish: first later low <= floor; bearish: first later high >= ceiling
+        after = self.formed_at + 1
+        bull_fill = first_reach(low, after, self.bottom, np.less_equal, np.fmin)
+        bear_fill = first_reach(high, after, self.top, np.greater_equal, np.fmax)
+        self.mitigated_at = np.where(self.is_bull, bull_fill, bear_fill)
+
+    def unmitigated(self, current_time):
+        """Positions (in formation order) of the gaps open on candles up to `current_time`."""
+        return self.unmitigated_prefix(np.searchsorted(self.timestamps, current_time, side='right'))
+
+    def unmitigated_prefix(self, length):
+        """Positions of the gaps open on the first `length` candles."""
+        formed = np.searchsorted(self.formed_at, length - 1, side='right')
+        return np.flatnonzero(self.mitigated_at[:formed] >= length)
+
+
 # ──────────────────────────────────────────────────────────────
 # Multi-TF SR Scanner with Confluence Merge
 # ──────────────────────────────────────────────────────────────
 
-def scan_sr_multi_tf(datasets, current_time):
+def scan_sr_multi_tf(datasets, current_time, pivot_index=None, slices=None):
     """
     Run SR scanner on each TF independently, then merge to find
     cross-TF confluences (like main.py's multi-TF scan).
+    `pivot_index` (build_pivot_index) supplies the fractals without argrelextrema.
+    `slices` ({tf: closed-candle prefix}, aligned_slices) replaces the
+    timestamp search, leaves out higher-TF candles still forming and is
+    shared by the three scanners.
     """
     all_fractal_levels = []  # List of (price, tf_string)
+    clock_tf = min(datasets.keys(), key=lambda t: TF_RANK.get(t, 99))
+    clock_df = None
 
     for tf, df in datasets.items():
         try:
-            slice_df = get_tf_slice(df, current_time)
+            slice_df = closed_slice(df, tf, current_time, slices)
+            if tf == clock_tf:
+                clock_df = slice_df
             if len(slice_df) < 30:
                 continue
 
@@ -122,7 +263,11 @@ def scan_sr_multi_tf(datasets, current_time):
             atr_pct = calculate_atr_pct(slice_df)
             threshold = atr_pct * 0.25
 
-            supports, resistances = get_fractal_extremes(slice_df, tf, order=order)
+            pivots = None
+            if pivot_index:
+                timeline = pivot_index['sr'][tf]
+                pivots = timeline.visible_prefix(len(slice_df)) if slices else timeline.visible(current_time)
+            supports, resistances = get_fractal_extremes(slice_df, tf, order=order, pivots=pivots)
             # Don't cluster yet — collect raw fractals for cross-TF merge
             all_fractal_levels.extend(supports + resistances)
         except Exception:
@@ -131,9 +276,9 @@ def scan_sr_multi_tf(datasets, current_time):
     if not all_fractal_levels:
         return []
 
-    # Cluster ALL fractals across TFs using the clock TF's ATR
-    clock_tf = min(datasets.keys(), key=lambda t: TF_RANK.get(t, 99))
-    clock_df = get_tf_slice(datasets[clock_tf], current_time)
+    # Cluster ALL fractals across TFs using the clock TF's ATR (slice reused from the loop)
+    if clock_df is None:
+        clock_df = closed_slice(datasets[clock_tf], clock_tf, current_time, slices)
     if len(clock_df) < 30:
         return []
 
@@ -161,21 +306,28 @@ def scan_sr_multi_tf(datasets, current_time):
 # Multi-TF RSI Divergence Scanner
 # ──────────────────────────────────────────────────────────────
 
-def scan_divergences_multi_tf(datasets, current_time):
+def scan_divergences_multi_tf(datasets, current_time, pivot_index=None, slices=None):
     """
     Run RSI divergence scanner on each TF with time-based activity filter.
-    Returns divergences with their source TF.
+    Returns divergences with their source TF. `pivot_index` and `slices`
+    as in scan_sr_multi_tf.
     """
     all_divs = []
 
     for tf, df in datasets.items():
         try:
-            slice_df = get_tf_slice(df, current_time)
+            slice_df = closed_slice(df, tf, current_time, slices)
             if len(slice_df) < 30:
                 continue
 
             order = ORDER_MAP.get(tf, 5)
-            divs = check_divergences(slice_df.copy(), order=order, historical=True, lookback_window=60)
+            pivots = None
+            if pivot_index:
+                timeline = pivot_index['rsi'][tf]
+                pivots = timeline.visible_prefix(len(slice_df)) if slices else timeline.visible(current_time)
+            # Precomputed RSI column; check_divergences leaves the slice untouched
+            divs = check_divergences(slice_df, order=order, historical=True, lookback_window=60,
+                                     rsi=slice_df['rsi'], pivots=pivots)
 
             # Time-based activity filter
             activity_hours = RSI_ACTIVITY_HOURS.get(tf, 24)
@@ -208,19 +360,35 @@ def scan_divergences_multi_tf(datasets, current_time):
 # Multi-TF FVG Scanner
 # ──────────────────────────────────────────────────────────────
 
-def scan_fvg_multi_tf(datasets, current_time):
+def scan_fvg_multi_tf(datasets, current_time, fvg_index=None, slices=None):
     """
     Run FVG scanner on each TF. Higher TFs get more weight.
+    With `fvg_index` ({tf: FVGLifetimeIndex}) the open gaps are looked up
+    instead of rescanning each slice with find_unmitigated_fvgs.
+    `slices` as in scan_sr_multi_tf.
     """
     all_fvgs = []
 
     for tf, df in datasets.items():
         try:
-            slice_df = get_tf_slice(df, current_time)
-            if len(slice_df) < 5:
-                continue
+            if fvg_index is not None:
+                index = fvg_index[tf]
+                if slices is not None:
+                    length = len(slices[tf])
+                else:
+                    length = np.searchsorted(index.timestamps, current_time, side='right')
+                if length < 5:
+                    continue
+                open_gaps = index.unmitigated_prefix(length)
+                fvgs = [{'techo': index.top[g], 'piso': index.bottom[g],
+                         'tipo': '🟢 FVG ALCISTA' if index.is_bull[g] else '🔴 FVG BAJISTA'}
+                        for g in open_gaps.tolist()]
+            else:
+                slice_df = closed_slice(df, tf, current_time, slices)
+                if len(slice_df) < 5:
+                    continue
+                fvgs = find_unmitigated_fvgs(slice_df)
 
-            fvgs = find_unmitigated_fvgs(slice_df)
             for fvg in fvgs:
                 center = (fvg['techo'] + fvg['piso']) / 2
                 all_fvgs.append({
@@ -693,6 +861,12 @@ def run_backtest(dataset_dir, tp_pct, sl_pct, leverage,
     cached_sr = []
     cached_fvgs = []
     cached_divs = []
+    # Every FVG's formation/mitigation computed once per TF
+    fvg_index = {tf: FVGLifetimeIndex(df) for tf, df in datasets.items()}
+    # Every pivot found once, revealed at its confirmation time
+    pivot_index = build_pivot_index(datasets)
+    # Closed candles of every TF at each clock candle
+    alignment = build_tf_alignment(datasets, clock_tf)
 
     sim_candles = total_candles - WARMUP_CANDLES
     print(f"\n   Reloj: {clock_tf} | Total: {total_candles} | Warmup: {WARMUP_CANDLES} | Simulando: {sim_candles} velas")
@@ -732,9 +906,11 @@ def run_backtest(dataset_dir, tp_pct, sl_pct, leverage,
         # 2. Run scanners periodically
         if i % scan_interval == 0:
             # Use scan cache: slice each TF once per cycle
-            cached_sr = scan_sr_multi_tf(datasets, current_time)
-            cached_fvgs = scan_fvg_multi_tf(datasets, current_time)
-            cached_divs = scan_divergences_multi_tf(datasets, current_time)
+            slices = aligned_slices(datasets, alignment, i)
+            cached_sr = scan_sr_multi_tf(datasets, current_time, pivot_index=pivot_index, slices=slices)
+            cached_fvgs = scan_fvg_multi_tf(datasets, current_time, fvg_index=fvg_index, slices=slices)
+            cached_divs = scan_divergences_multi_tf(datasets, current_time, pivot_index=pivot_index,
+                                                    slices=slices)
 
             # Debug: log scanner results every 10 scan cycles
             if (i // scan_interval) % 10 == 0:
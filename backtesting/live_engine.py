@@ -21,17 +21,19 @@ from typing import Dict, List, Optional, Callable
 
 import numpy as np
 import pandas as pd
-import ccxt
 import websockets
 
 # Add parent dir for scanner imports
 PARENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, PARENT_DIR)
 
-from sr_scanner import get_fractal_extremes, cluster_levels, calculate_atr_pct
-from smc_scanner import find_unmitigated_fvgs
-from rsi_divergence import check_divergences, calculate_rsi
+from sr_scanner import get_fractal_extremes, cluster_levels
+from smc_scanner import find_unmitigated_fvgs, FVGTracker
+from rsi_divergence import check_divergences, divergence_rows
 from elliott_scanner import scan_elliott_waves
+from utils.market_data import get_market_data_client
+from utils.indicators import calculate_atr_pct, calculate_rsi, StreamingEMA, StreamingRSI, StreamingATR
+from utils.pivots import StreamingPivotDetector, head_pivots
 
 logger = logging.getLogger("live_engine")
 
@@ -57,6 +59,10 @@ WARMUP_LIMITS = {
     '1w': 50
 }
 
+# Buffers past MAX_BUFFER_CANDLES drop their oldest candles down to BUFFER_TRIM_TO
+MAX_BUFFER_CANDLES = 2000
+BUFFER_TRIM_TO = 1500
+
 # RSI activity window (hours)
 RSI_ACTIVITY_HOURS = {'15m': 4, '1h': 12, '4h': 48, '1d': 168, '1w': 720}
 ORDER_MAP = {'15m': 3, '1h': 3, '4h': 5, '1d': 5, '1w': 5}
@@ -65,31 +71,165 @@ ORDER_MAP = {'15m': 3, '1h': 3, '4h': 5, '1d': 5, '1w': 5}
 # ──────────────────────────────────────────────────────────────
 # Technical Indicators
 # ──────────────────────────────────────────────────────────────
-def compute_indicators(df):
-    """Compute EMA(20,50,200) and RSI(14) for a DataFrame."""
-    if len(df) < 20:
-        return df
+INDICATOR_COLUMNS = ['ema_20', 'ema_50', 'ema_200', 'rsi', 'atr']
 
-    df = df.copy()
-    close = df['close']
 
-    # EMAs
-    df['ema_20'] = close.ewm(span=20, adjust=False).mean()
-    df['ema_50'] = close.ewm(span=50, adjust=False).mean()
-    if len(df) >= 200:
-        df['ema_200'] = close.ewm(span=200, adjust=False).mean()
+class BufferIndicators:
+    """
+    Incremental EMA(20,50,200), RSI(14) and ATR(14) for one TF buffer.
+    Each closed candle advances every indicator by one bar, so a candle close
+    costs the same regardless of how long the buffer is.
+    """
 
-    # RSI
-    df['rsi'] = calculate_rsi(close, period=14)
+    def __init__(self):
+        self.ema_20 = StreamingEMA(20)
+        self.ema_50 = StreamingEMA(50)
+        self.ema_200 = StreamingEMA(200)
+        self.rsi = StreamingRSI(14)
+        self.atr = StreamingATR(14)
+
+    def update(self, high, low, close):
+        """Advance one closed candle; returns its indicator row."""
+        return {
+            'ema_20': self.ema_20.update(close),
+            'ema_50': self.ema_50.update(close),
+            'ema_200': self.ema_200.update(close),
+            'rsi': self.rsi.update(close),
+            'atr': self.atr.update(high, low, close),
+        }
 
-    return df
+    def seed(self, df):
+        """Replay a warmup DataFrame and write the indicator columns into it."""
+        rows = [self.update(h, l, c) for h, l, c in
+                zip(df['high'].to_numpy(), df['low'].to_numpy(), df['close'].to_numpy())]
+        for col in INDICATOR_COLUMNS:
+            df[col] = [row[col] for row in rows]
+        return df
+
+
+# ──────────────────────────────────────────────────────────────
+# Candle Buffers
+# ──────────────────────────────────────────────────────────────
+BUFFER_COLUMNS = ['open', 'high', 'low', 'close', 'volume'] + INDICATOR_COLUMNS
+
+
+class CandleBuffer:
+    """
+    Closed candles of one TF in preallocated NumPy columns. append() writes
+    the row in place; trimming moves the kept rows to fresh arrays once
+    every MAX_BUFFER_CANDLES - BUFFER_TRIM_TO candles, so each close costs
+    amortized O(1). frame() wraps the filled rows in a read-only DataFrame
+    without copying, rebuilt only after the buffer changes.
+    """
+
+    def __init__(self, capacity=MAX_BUFFER_CANDLES + 1):
+        self._ts = np.empty(capacity, dtype='datetime64[ns]')
+        self._cols = {col: np.full(capacity, np.nan) for col in BUFFER_COLUMNS}
+        self._n = 0
+        self._frame = None
+
+    @classmethod
+    def from_frame(cls, df):
+        """Buffer holding a copy of `df` (e.g. a seeded warmup DataFrame)."""
+        n = len(df)
+        buf = cls(max(n, MAX_BUFFER_CANDLES) + 1)
+        if n:
+            buf._ts[:n] = pd.to_datetime(df['timestamp']).to_numpy().astype('datetime64[ns]')
+            for col in BUFFER_COLUMNS:
+                if col in df.columns:
+                    buf._cols[col][:n] = df[col].to_numpy(dtype=np.float64)
+        buf._n = n
+        return buf
+
+    def __len__(self):
+        return self._n
+
+    def append(self, candle):
+        """Write one candle dict (timestamp + any of BUFFER_COLUMNS) after the last row."""
+        if self._n == len(self._ts):
+            self._reallocate(self._n)
+        self._ts[self._n] = pd.Timestamp(candle['timestamp']).to_datetime64()
+        for col, values in self._cols.items():
+            values[self._n] = candle.get(col, np.nan)
+        self._n += 1
+        self._frame = None
+        if self._n > MAX_BUFFER_CANDLES:
+            self._reallocate(BUFFER_TRIM_TO)
+
+    def _reallocate(self, keep):
+        """
+        Move the last `keep` rows into new arrays. Frames already handed out
+        keep viewing the old ones, so a scan never sees rows shift under it.
+        """
+        capacity = max(2 * keep, MAX_BUFFER_CANDLES + 1)
+        start = self._n - keep
+        ts = np.empty(capacity, dtype='datetime64[ns]')
+        ts[:keep] = self._ts[start:self._n]
+        for col, values in self._cols.items():
+            fresh = np.full(capacity, np.nan)
+            fresh[:keep] = values[start:self._n]
+            self._cols[col] = fresh
+        self._ts = ts
+        self._n = keep
+        self._frame = None
+
+    def column(self, col, last=None):
+        """Read-only view of a column (its `last` values when given)."""
+        start = 0 if last is None else max(0, self._n - last)
+        view = self._cols[col][start:self._n]
+        view.flags.writeable = False
+        return view
+
+    def frame(self):
+        """The buffer as a DataFrame over the arrays (no copy; read-only)."""
+        if self._frame is None:
+            ts = self._ts[:self._n]
+            ts.flags.writeable = False
+            data = {'timestamp': ts, **{col: self.column(col) for col in BUFFER_COLUMNS}}
+            self._frame = pd.DataFrame(data, copy=False)
+        return self._frame
 
 
 # ──────────────────────────────────────────────────────────────
 # Scanner Functions (reuse from engine.py logic)
 # ──────────────────────────────────────────────────────────────
-def scan_sr_from_buffers(buffers, current_price=0):
-    """Run SR scanner on all TF buffers, return merged levels."""
+def buffer_pivots(detectors, tf, order, df, first=0):
+    """
+    Pivot positions in `df` from the (tf, order) streaming detector, or None
+    when there is no detector so the scanner falls back to argrelextrema.
+    The buffer holds the detector's last len(df) candles; the pivots are
+    those argrelextrema finds on df[first:]. The first `order` candles of
+    that slice are re-evaluated on it: once the buffer has trimmed (or
+    when `first` skips rows), their window there is cut short.
+    """
+    detector = (detectors or {}).get((tf, order))
+    if detector is None:
+        return None
+    start = detector.count - len(df)
+    max_idx, min_idx = detector.pivot_indices(start=start + first + order)
+    high, low = df['high'].values[first:], df['low'].values[first:]
+    return (np.concatenate([head_pivots(high, order, np.greater_equal) + first, max_idx - start]),
+            np.concatenate([head_pivots(low, order, np.less_equal) + first, min_idx - start]))
+
+
+def divergence_pivots(detectors, tf, order, df, rsi):
+    """
+    buffer_pivots over the rows check_divergences analyzes (the buffer minus
+    the RSI warmup), as positions in `df`. None, so check_divergences runs
+    argrelextrema itself, when those rows are not a contiguous tail.
+    """
+    kept = divergence_rows(df, rsi)
+    first = int(np.argmax(kept))
+    if not kept[first:].all():
+        return None
+    return buffer_pivots(detectors, tf, order, df, first=first)
+
+
+def scan_sr_from_buffers(buffers, current_price=0, pivots=None):
+    """
+    Run SR scanner on all TF buffers, return merged levels. `pivots` maps
+    (tf, order) → StreamingPivotDetector kept up to date with the buffers.
+    """
     all_supports = []
     all_resistances = []
     analysis_tfs = ['15m', '1h', '4h', '1d', '1w']
@@ -100,7 +240,8 @@ def scan_sr_from_buffers(buffers, current_price=0):
             continue
         try:
             order = 3 if tf in ['15m', '1h'] else 5
-            supports, resistances = get_fractal_extremes(df, tf, order=order)
+            supports, resistances = get_fractal_extremes(
+                df, tf, order=order, pivots=buffer_pivots(pivots, tf, order, df))
             all_supports.extend(supports)
             all_resistances.extend(resistances)
         except Exception as e:
@@ -114,6 +255,7 @@ def scan_sr_from_buffers(buffers, current_price=0):
     # Calculate ATR from 15m for threshold
     df_15m = buffers.get('15m')
     if df_15m is not None and len(df_15m) >= 20:
+        # Reads the buffer's streaming `atr` column
         atr_pct = calculate_atr_pct(df_15m)
         threshold = atr_pct * 0.5
     else:
@@ -143,15 +285,23 @@ def scan_sr_from_buffers(buffers, current_price=0):
     return merged
 
 
-def scan_fvg_from_buffers(buffers, current_price):
-    """Run FVG scanner on all TF buffers."""
+def scan_fvg_from_buffers(buffers, current_price, trackers=None):
+    """
+    Run FVG scanner on all TF buffers. With `trackers` ({tf: FVGTracker}
+    kept up to date on every candle close) the open gaps are read from them
+    instead of rescanning each buffer; the buffer holds the tracker's last
+    len(df) candles.
+    """
     all_fvgs = []
     for tf in ['15m', '1h', '4h', '1d', '1w']:
         df = buffers.get(tf)
         if df is None or len(df) < 5:
             continue
         try:
-            fvgs = find_unmitigated_fvgs(df)
+            if trackers is not None and tf in trackers:
+                fvgs = trackers[tf].gaps(start=trackers[tf].count - len(df))
+            else:
+                fvgs = find_unmitigated_fvgs(df)
             for fvg in fvgs:
                 center = (fvg['techo'] + fvg['piso']) / 2
                 all_fvgs.append({
@@ -167,8 +317,8 @@ def scan_fvg_from_buffers(buffers, current_price):
     return all_fvgs
 
 
-def scan_divergences_from_buffers(buffers, current_time):
-    """Run RSI divergence scanner on all TF buffers."""
+def scan_divergences_from_buffers(buffers, current_time, pivots=None):
+    """Run RSI divergence scanner on all TF buffers (`pivots` as in scan_sr_from_buffers)."""
     all_divs = []
     for tf in ['15m', '1h', '4h', '1d']:
         df = buffers.get(tf)
@@ -176,7 +326,10 @@ def scan_divergences_from_buffers(buffers, current_time):
             continue
         try:
             order = ORDER_MAP.get(tf, 5)
-            divs = check_divergences(df.copy(), order=order, historical=True, lookback_window=60)
+            # Reuse the RSI the buffer already carries instead of recomputing it
+            rsi = df['rsi'] if 'rsi' in df.columns else calculate_rsi(df['close'])
+            divs = check_divergences(df, order=order, historical=True, lookback_window=60, rsi=rsi,
+                                     pivots=divergence_pivots(pivots, tf, order, df, rsi))
 
             activity_hours = RSI_ACTIVITY_HOURS.get(tf, 24)
             activity_cutoff = current_time - pd.Timedelta(hours=activity_hours)
@@ -343,8 +496,14 @@ class LivePaperEngine:
         self.ccxt_symbol = 'BTC/USDT'
         self.config = {}
 
-        # Candle buffers per TF (DataFrames)
-        self.buffers: Dict[str, pd.DataFrame] = {}
+        # Candle buffers per TF
+        self.buffers: Dict[str, CandleBuffer] = {}
+        # Streaming indicator state per TF buffer
+        self.indicators: Dict[str, BufferIndicators] = {}
+        # Open FVGs per TF buffer, updated candle by candle
+        self.fvg_trackers: Dict[str, FVGTracker] = {}
+        # Fractal pivots per (TF, order) for the SR and divergence scanners
+        self.pivot_detectors: Dict[tuple, StreamingPivotDetector] = {}
 
         # Current forming candle (15m)
         self.current_candle = None
@@ -480,25 +639,32 @@ class LivePaperEngine:
         logger.info("📦 Warming up — downloading historical candles...")
         await self._emit('status', {'message': 'Descargando velas históricas...'})
 
-        exchange = ccxt.binance({'enableRateLimit': True})
+        client = get_market_data_client()
 
+        warmup = {}
         for tf, limit in WARMUP_LIMITS.items():
             try:
-                bars = exchange.fetch_ohlcv(self.ccxt_symbol, timeframe=tf, limit=limit)
+                bars = client.fetch_ohlcv(self.ccxt_symbol, timeframe=tf, limit=limit)
                 df = pd.DataFrame(bars, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
                 df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-                self.buffers[tf] = df
+                warmup[tf] = df
                 logger.info(f"   ✅ {tf}: {len(df)} velas cargadas")
                 await self._emit('status', {'message': f'Warmup {tf}: {len(df)} velas'})
-                await asyncio.sleep(0.3)  # Rate limit
             except Exception as e:
                 logger.error(f"   ❌ Error warmup {tf}: {e}")
-                self.buffers[tf] = pd.DataFrame(columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-
-        # Compute indicators on warmup data
-        for tf in self.buffers:
-            if len(self.buffers[tf]) >= 20:
-                self.buffers[tf] = compute_indicators(self.buffers[tf])
+                warmup[tf] = pd.DataFrame(columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+
+        # Seed the streaming indicators, FVG trackers and pivot detectors with the warmup data
+        for tf, df in warmup.items():
+            self.indicators[tf] = BufferIndicators()
+            df = self.indicators[tf].seed(df)
+            self.buffers[tf] = CandleBuffer.from_frame(df)
+            self.fvg_trackers[tf] = FVGTracker()
+            self.fvg_trackers[tf].feed(df)
+            if tf in ORDER_MAP:
+                detector = StreamingPivotDetector(ORDER_MAP[tf])
+                detector.feed(df)
+                self.pivot_detectors[(tf, detector.order)] = detector
 
         # Run initial scan
         await self._run_scanners()
@@ -579,25 +745,15 @@ class LivePaperEngine:
         self._candle_count_15m += 1
         close_time = pd.Timestamp(ts, unit='ms')
 
-        # Append to 15m buffer
-        new_row = pd.DataFrame([{
+        # Append to 15m buffer (indicators advanced by one bar; trimmed past MAX_BUFFER_CANDLES)
+        self._append_candle('15m', {
             'timestamp': close_time,
             'open': o, 'high': h, 'low': l, 'close': c, 'volume': v
-        }])
-        self.buffers['15m'] = pd.concat([self.buffers['15m'], new_row], ignore_index=True)
-
-        # Keep buffer manageable (max 2000 candles per TF)
-        for tf in self.buffers:
-            if len(self.buffers[tf]) > 2000:
-                self.buffers[tf] = self.buffers[tf].iloc[-1500:].reset_index(drop=True)
+        })
 
         # Aggregate higher TFs
         self._aggregate_higher_tfs(close_time, o, h, l, c, v)
 
-        # Recompute indicators for 15m
-        if len(self.buffers['15m']) >= 20:
-            self.buffers['15m'] = compute_indicators(self.buffers['15m'])
-
         # Run scanners every 3 candle closes (~45 min)
         scan_interval = self.config.get('scan_interval', 3)
         if self._candle_count_15m % scan_interval == 0:
@@ -666,12 +822,6 @@ class LivePaperEngine:
         """Aggregate 15m candles into higher TFs."""
         for tf, period in TF_AGGREGATION.items():
             if self._candle_count_15m % period != 0:
-                # Update the current forming candle for this TF
-                if tf in self.buffers and len(self.buffers[tf]) > 0:
-                    last = self.buffers[tf].iloc[-1]
-                    # Only update if this candle is still forming
-                    # (we detect by checking if a full period hasn't elapsed)
-                    pass
                 continue
 
             # Full period elapsed — build a new candle from the last N 15m candles
@@ -679,20 +829,32 @@ class LivePaperEngine:
             if buf_15m is None or len(buf_15m) < period:
                 continue
 
-            chunk = buf_15m.iloc[-period:]
-            new_candle = pd.DataFrame([{
+            self._append_candle(tf, {
                 'timestamp': close_time,
-                'open': chunk['open'].iloc[0],
-                'high': chunk['high'].max(),
-                'low': chunk['low'].min(),
-                'close': chunk['close'].iloc[-1],
-                'volume': chunk['volume'].sum()
-            }])
-            self.buffers[tf] = pd.concat([self.buffers[tf], new_candle], ignore_index=True)
-
-            # Recompute indicators for this TF
-            if len(self.buffers[tf]) >= 20:
-                self.buffers[tf] = compute_indicators(self.buffers[tf])
+                'open': float(buf_15m.column('open', period)[0]),
+                'high': float(buf_15m.column('high', period).max()),
+                'low': float(buf_15m.column('low', period).min()),
+                'close': float(buf_15m.column('close', period)[-1]),
+                'volume': float(buf_15m.column('volume', period).sum())
+            })
+
+    def _append_candle(self, tf, candle):
+        """Append a closed candle to a TF buffer with its indicator values."""
+        state = self.indicators.setdefault(tf, BufferIndicators())
+        candle.update(state.update(candle['high'], candle['low'], candle['close']))
+        tracker = self.fvg_trackers.setdefault(tf, FVGTracker())
+        tracker.update(candle['high'], candle['low'], candle['timestamp'])
+        detector = self.pivot_detectors.get((tf, ORDER_MAP.get(tf)))
+        if detector is not None:
+            detector.update(candle['high'], candle['low'], candle['timestamp'])
+        buf = self.buffers.setdefault(tf, CandleBuffer())
+        buf.append(candle)
+        # Gaps that started before the buffer's first candle are gone for good once it trims
+        tracker.discard_before(tracker.count - len(buf))
+
+    def _frames(self):
+        """DataFrame view of every buffer, built once per scan."""
+        return {tf: buf.frame() for tf, buf in self.buffers.items()}
 
     # ── Scanners ──────────────────────────────────────────
     async def _run_scanners(self):
@@ -701,18 +863,21 @@ class LivePaperEngine:
 
         # Run scanners in executor (they are CPU-bound)
         current_price = self.current_candle['close'] if self.current_candle else 0
+        frames = self._frames()
         self.cached_sr = await loop.run_in_executor(
-            None, lambda: scan_sr_from_buffers(self.buffers, current_price))
-        self.cached_fvgs = await loop.run_in_executor(None, scan_fvg_from_buffers, self.buffers, current_price)
+            None, lambda: scan_sr_from_buffers(frames, current_price, self.pivot_detectors))
+        self.cached_fvgs = await loop.run_in_executor(
+            None, lambda: scan_fvg_from_buffers(frames, current_price, self.fvg_trackers))
 
         current_time = pd.Timestamp.now()
-        self.cached_divs = await loop.run_in_executor(None, scan_divergences_from_buffers, self.buffers, current_time)
+        self.cached_divs = await loop.run_in_executor(
+            None, lambda: scan_divergences_from_buffers(frames, current_time, self.pivot_detectors))
 
         # ── Multi-TF Elliott Wave Scan ──
         elliott_results = {}
         for tf in ['15m', '1h', '4h', '1d', '1w']:
-            if tf in self.buffers and len(self.buffers[tf]) > 50:
-                df_tf = self.buffers[tf]
+            if tf in frames and len(frames[tf]) > 50:
+                df_tf = frames[tf]
                 payload = await loop.run_in_executor(
                     None, lambda d=df_tf: scan_elliott_waves(d, current_price, atr_multiplier=1.8))
                 
@@ -881,9 +1046,10 @@ class LivePaperEngine:
 
     def get_candles(self, tf='15m', limit=500):
         """Get candle data for a specific TF (for chart rendering)."""
-        df = self.buffers.get(tf)
-        if df is None or len(df) == 0:
+        buf = self.buffers.get(tf)
+        if buf is None or len(buf) == 0:
             return []
+        df = buf.frame()
 
         df_slice = df.tail(limit)
         candles = []
@@ -901,12 +1067,15 @@ class LivePaperEngine:
 
     def get_indicators(self, tf='15m', limit=500):
         """Get indicator data for a specific TF."""
-        df = self.buffers.get(tf)
-        if df is None or len(df) == 0:
+        buf = self.buffers.get(tf)
+        if buf is None or len(buf) == 0:
             return {'ema_20': [], 'ema_50': [], 'ema_200': [], 'rsi': []}
+        df = buf.frame()
 
         df_slice = df.tail(limit)
         result = {'ema_20': [], 'ema_50': [], 'ema_200': [], 'rsi': []}
+        # EMA 200 is only meaningful once the buffer holds 200 candles
+        show_ema_200 = 'ema_200' in df_slice.columns and len(df) >= 200
 
         for _, row in df_slice.iterrows():
             t = self._ts_to_seconds(row['timestamp'])
@@ -914,7 +1083,7 @@ class LivePaperEngine:
                 result['ema_20'].append({'time': t, 'value': round(float(row['ema_20']), 2)})
             if 'ema_50' in df_slice.columns and pd.notna(row.get('ema_50')):
                 result['ema_50'].append({'time': t, 'value': round(float(row['ema_50']), 2)})
-            if 'ema_200' in df_slice.columns and pd.notna(row.get('ema_200')):
+            if show_ema_200 and pd.notna(row.get('ema_200')):
                 result['ema_200'].append({'time': t, 'value': round(float(row['ema_200']), 2)})
             if 'rsi' in df_slice.columns and pd.notna(row.get('rsi')):
                 result['rsi'].append({'time': t, 'value': round(float(row['rsi']), 2)})
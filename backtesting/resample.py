@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+resample.py — Construye TFs altos a partir de una serie base (15m o 1m).
+
+Los buckets se alinean igual que Binance: 4h/1d desde 00:00 UTC (múltiplos
+exactos desde epoch) y 1w desde el lunes 00:00 UTC. La primera vela derivada
+se descarta si la serie base empieza a mitad del bucket; la última se conserva
+aunque esté formándose, igual que la vela en curso que devuelve el exchange.
+"""
+
+import numpy as np
+import pandas as pd
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+# 1970-01-01 was a Thursday: Binance weekly candles open on Monday 00:00 UTC
+WEEK_OFFSET_MS = 4 * 24 * 60 * 60 * 1000
+WEEK_MS = 7 * 24 * 60 * 60 * 1000
+
+
+def bucket_offset_ms(tf_ms):
+    return WEEK_OFFSET_MS if tf_ms == WEEK_MS else 0
+
+
+def bucket_starts(timestamps_ms, tf_ms):
+    """Open time (ms) of the exchange-aligned `tf_ms` bucket containing each timestamp."""
+    offset = bucket_offset_ms(tf_ms)
+    ts = np.asarray(timestamps_ms, dtype=np.int64)
+    return (ts - offset) // tf_ms * tf_ms + offset
+
+
+def resample_ohlcv(base_df, tf_ms):
+    """
+    Aggregate a sorted base OHLCV DataFrame (timestamp in ms) into `tf_ms`
+    candles: first open, max high, min low, last close, summed volume.
+    """
+    if base_df is None or len(base_df) == 0:
+        return pd.DataFrame(columns=OHLCV_COLUMNS)
+
+    ts = base_df['timestamp'].to_numpy(dtype=np.int64)
+    buckets = bucket_starts(ts, tf_ms)
+
+    # Rows are time-sorted, so each bucket is a contiguous run: reduce per run
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(ts)] - 1
+
+    derived = pd.DataFrame({
+        'timestamp': buckets[starts],
+        'open': base_df['open'].to_numpy()[starts],
+        'high': np.maximum.reduceat(base_df['high'].to_numpy(), starts),
+        'low': np.minimum.reduceat(base_df['low'].to_numpy(), starts),
+        'close': base_df['close'].to_numpy()[ends],
+        'volume': np.add.reduceat(base_df['volume'].to_numpy(dtype=np.float64), starts),
+    })
+
+    # Base series starting mid-bucket → first derived candle is incomplete
+    if ts[0] != buckets[0]:
+        derived = derived.iloc[1:].reset_index(drop=True)
+    return derived
+
+
+def compare_with_native(derived, native, rel_tol=1e-6):
+    """
+    Check derived candles against the exchange's native bars (same TF).
+    Returns {'compared': n, 'mismatches': [timestamp, ...]}.
+    """
+    merged = derived.merge(native, on='timestamp', suffixes=('_derived', '_native'))
+    mismatched = np.zeros(len(merged), dtype=bool)
+    for col in ['open', 'high', 'low', 'close', 'volume']:
+        a = merged[f"{col}_derived"].to_numpy(dtype=np.float64)
+        b = merged[f"{col}_native"].to_numpy(dtype=np.float64)
+        mismatched |= ~np.isclose(a, b, rtol=rel_tol, atol=0.0)
+    return {
+        'compared': int(len(merged)),
+        'mismatches': merged.loc[mismatched, 'timestamp'].astype('int64').tolist(),
+    }
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+bench_fvg.py — Benchmark de smc_scanner.find_unmitigated_fvgs (vectorizado)
+contra el escaneo con bucles que reemplazó (copiado abajo como referencia).
+
+Uso:
+    python benchmarks/bench_fvg.py                    # 500, 5k y 50k velas
+    python benchmarks/bench_fvg.py --sizes 1000 20000 --repeat 5
+"""
+
+import os
+import sys
+import argparse
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from smc_scanner import find_unmitigated_fvgs
+from benchmarks.bench_indicators import synthetic_ohlcv, best_of
+
+
+# ── Implementación anterior (referencia) ──────────────────────
+def legacy_find_unmitigated_fvgs(df):
+    fvgs = []
+    for i in range(2, len(df)):
+        vela1_high = df['high'].iloc[i-2]
+        vela1_low = df['low'].iloc[i-2]
+        vela2_time = df['timestamp'].iloc[i-1]
+        vela3_high = df['high'].iloc[i]
+        vela3_low = df['low'].iloc[i]
+        if vela3_low > vela1_high:
+            fvgs.append({'tipo': '🟢 FVG ALCISTA', 'techo': vela3_low, 'piso': vela1_high,
+                         'fecha': vela2_time, 'idx_formacion': i, 'mitigado': False})
+        elif vela3_high < vela1_low:
+            fvgs.append({'tipo': '🔴 FVG BAJISTA', 'techo': vela1_low, 'piso': vela3_high,
+                         'fecha': vela2_time, 'idx_formacion': i, 'mitigado': False})
+
+    unmitigated_fvgs = []
+    for fvg in fvgs:
+        mitigado = False
+        for j in range(fvg['idx_formacion'] + 1, len(df)):
+            if fvg['tipo'] == '🟢 FVG ALCISTA':
+                if df['low'].iloc[j] <= fvg['piso']:
+                    mitigado = True
+                    break
+            elif fvg['tipo'] == '🔴 FVG BAJISTA':
+                if df['high'].iloc[j] >= fvg['techo']:
+                    mitigado = True
+                    break
+        if not mitigado:
+            unmitigated_fvgs.append(fvg)
+    return unmitigated_fvgs
+
+
+def with_timestamps(df):
+    df = df.copy()
+    df['timestamp'] = pd.date_range('2020-01-01', periods=len(df), freq='15min')
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de find_unmitigated_fvgs')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 5_000, 50_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"📏 mejor de {args.repeat} (bucles: 1 corrida)")
+    print(f"{'Velas':>8} {'FVGs':>6} {'bucles':>11} {'numpy':>10} {'speedup':>9} {'iguales':>8}")
+    for bars in args.sizes:
+        df = with_timestamps(synthetic_ohlcv(bars))
+        t_old, old = best_of(lambda: legacy_find_unmitigated_fvgs(df), 1)
+        t_new, new = best_of(lambda: find_unmitigated_fvgs(df), args.repeat)
+        same = 'sí' if old == new else 'NO'
+        print(f"{bars:>8,} {len(new):>6} {t_old*1000:>9.1f}ms {t_new*1000:>8.2f}ms {t_old/t_new:>8.0f}x {same:>8}")
+
+
+if __name__ == '__main__':
+    main()
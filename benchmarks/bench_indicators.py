@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+bench_indicators.py — Micro-benchmark de utils/indicators contra las
+implementaciones pandas que reemplazó (copiadas abajo como referencia).
+
+Uso:
+    python benchmarks/bench_indicators.py              # 100k velas
+    python benchmarks/bench_indicators.py --bars 500000 --repeat 5
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import indicators
+
+
+# ── Implementaciones anteriores (referencia) ──────────────────
+def legacy_rsi(series, period=14):
+    delta = series.diff(1)
+    gain = delta.where(delta > 0, 0)
+    loss = -delta.where(delta < 0, 0)
+    avg_gain = gain.ewm(com=period - 1, min_periods=period).mean()
+    avg_loss = loss.ewm(com=period - 1, min_periods=period).mean()
+    rs = avg_gain / avg_loss
+    return 100 - (100 / (1 + rs))
+
+def legacy_obv(close, volume):
+    obv = [0]
+    for i in range(1, len(close)):
+        if close.iloc[i] > close.iloc[i-1]:
+            obv.append(obv[-1] + volume.iloc[i])
+        elif close.iloc[i] < close.iloc[i-1]:
+            obv.append(obv[-1] - volume.iloc[i])
+        else:
+            obv.append(obv[-1])
+    return pd.Series(obv, index=close.index)
+
+def legacy_atr(df, period=14):
+    high_low = df['high'] - df['low']
+    high_close = (df['high'] - df['close'].shift()).abs()
+    low_close = (df['low'] - df['close'].shift()).abs()
+    tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
+    return tr.rolling(window=period).mean()
+
+def legacy_ema(close, span=21):
+    return close.ewm(span=span, adjust=False).mean()
+
+
+def synthetic_ohlcv(bars, seed=42):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.002, bars)))
+    spread = np.abs(rng.normal(0, 0.0015, bars)) * close
+    open_ = np.r_[close[0], close[:-1]]
+    return pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) + spread,
+        'low': np.minimum(open_, close) - spread,
+        'close': close,
+        'volume': rng.gamma(2.0, 50.0, bars),
+    })
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de utils/indicators')
+    parser.add_argument('--bars', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = synthetic_ohlcv(args.bars)
+    close = df['close']
+
+    cases = [
+        ('RSI(14)', lambda: legacy_rsi(close), lambda: indicators.calculate_rsi(close)),
+        ('OBV', lambda: legacy_obv(close, df['volume']), lambda: indicators.calculate_obv(close, df['volume'])),
+        ('ATR(14)', lambda: legacy_atr(df), lambda: indicators.calculate_atr(df)),
+        ('EMA(21)', lambda: legacy_ema(close), lambda: indicators.ema(close, 21)),
+    ]
+
+    print(f"📏 {args.bars:,} velas | mejor de {args.repeat}")
+    print(f"{'Indicador':<10} {'pandas':>10} {'numpy':>10} {'speedup':>9} {'max |Δ|':>10}")
+    for name, legacy, vectorized in cases:
+        t_old, old = best_of(legacy, 1 if name == 'OBV' else args.repeat)
+        t_new, new = best_of(vectorized, args.repeat)
+        diff = np.nanmax(np.abs(np.asarray(old, dtype=float) - np.asarray(new, dtype=float)))
+        print(f"{name:<10} {t_old*1000:>8.1f}ms {t_new*1000:>8.1f}ms {t_old/t_new:>8.1f}x {diff:>10.2e}")
+
+
+if __name__ == '__main__':
+    main()
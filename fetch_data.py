@@ -1,14 +1,21 @@
 import yfinance as yf
-import ccxt
-import pandas as pd
-import numpy as np
-import urllib.request
-import xml.etree.ElementTree as ET
 import os
 import json
 import requests
 from openai import OpenAI
 
+from utils.ohlcv_cache import get_ohlcv
+from utils.indicators import (
+    calculate_rsi,
+    calculate_macd,
+    calculate_stochastic,
+    calculate_bollinger,
+    calculate_obv,
+    calculate_atr,
+)
+from utils.news import get_news
+from utils.llm_cache import complete_json
+
 client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
@@ -17,49 +24,6 @@ TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
 # Technical Indicator Functions
 # ──────────────────────────────────────────────────────────────
 
-def calculate_rsi(series, period=14):
-    """RSI using Wilder's RMA (matches TradingView / industry standard)."""
-    delta = series.diff(1)
-    gain = delta.where(delta > 0, 0)
-    loss = -delta.where(delta < 0, 0)
-    avg_gain = gain.ewm(com=period - 1, min_periods=period).mean()
-    avg_loss = loss.ewm(com=period - 1, min_periods=period).mean()
-    rs = avg_gain / avg_loss
-    return 100 - (100 / (1 + rs))
-
-def calculate_macd(close, fast=12, slow=26, signal=9):
-    ema_fast = close.ewm(span=fast, adjust=False).mean()
-    ema_slow = close.ewm(span=slow, adjust=False).mean()
-    macd_line = ema_fast - ema_slow
-    signal_line = macd_line.ewm(span=signal, adjust=False).mean()
-    histogram = macd_line - signal_line
-    return macd_line, signal_line, histogram
-
-def calculate_stochastic(df, k_period=14, d_period=3):
-    low_min = df['low'].rolling(window=k_period).min()
-    high_max = df['high'].rolling(window=k_period).max()
-    k = 100 * (df['close'] - low_min) / (high_max - low_min)
-    d = k.rolling(window=d_period).mean()
-    return k, d
-
-def calculate_bollinger(close, period=20, std_dev=2):
-    sma = close.rolling(window=period).mean()
-    std = close.rolling(window=period).std()
-    upper = sma + (std * std_dev)
-    lower = sma - (std * std_dev)
-    return upper, sma, lower
-
-def calculate_obv(close, volume):
-    obv = [0]
-    for i in range(1, len(close)):
-        if close.iloc[i] > close.iloc[i-1]:
-            obv.append(obv[-1] + volume.iloc[i])
-        elif close.iloc[i] < close.iloc[i-1]:
-            obv.append(obv[-1] - volume.iloc[i])
-        else:
-            obv.append(obv[-1])
-    return pd.Series(obv, index=close.index)
-
 def semaphore_signal(indicator, value, **kwargs):
     """Convert an indicator value to a traffic light signal."""
     price = kwargs.get('price', 0)
@@ -122,11 +86,7 @@ def build_indicators(df, price):
     bb_upper, bb_mid, bb_lower = calculate_bollinger(close)
     
     # ATR
-    high_low = df['high'] - df['low']
-    high_close = (df['high'] - close.shift()).abs()
-    low_close = (df['low'] - close.shift()).abs()
-    tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-    atr_val = tr.rolling(14).mean().iloc[-1]
+    atr_val = calculate_atr(df, period=14).iloc[-1]
     
     # OBV
     has_volume = 'volume' in df.columns and df['volume'].sum() > 0
@@ -203,21 +163,9 @@ def build_indicators(df, price):
 
 
 # ──────────────────────────────────────────────────────────────
-# News
+# Telegram
 # ──────────────────────────────────────────────────────────────
 
-def get_news(query, limit=7):
-    try:
-        q = query.replace(' ', '+')
-        url = f"https://news.google.com/rss/search?q={q}+crypto+market&hl=en-US&gl=US&ceid=US:en"
-        req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-        xml_data = urllib.request.urlopen(req).read()
-        root = ET.fromstring(xml_data)
-        headlines = [item.find('title').text for item in root.findall('.//item')[:limit]]
-        return headlines if headlines else ["Sin noticias relevantes."]
-    except:
-        return ["Error obteniendo noticias."]
-
 def send_telegram(text):
     if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
         print("⚠️ No Telegram credentials.")
@@ -257,7 +205,6 @@ def fetch_market_data(send_alert=True):
             print(f"  ⚠️ Error {name}: {e}")
 
     # Crypto Assets — full indicators + news
-    exchange = ccxt.binance()
     cryptos = {
         'BTC/USDT': 'Bitcoin', 'ETH/USDT': 'Ethereum',
         'BNB/USDT': 'Binance Coin', 'SOL/USDT': 'Solana', 'XRP/USDT': 'XRP'
@@ -265,8 +212,7 @@ def fetch_market_data(send_alert=True):
     
     for symbol, name in cryptos.items():
         try:
-            bars = exchange.fetch_ohlcv(symbol, timeframe='1d', limit=250)
-            df = pd.DataFrame(bars, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+            df = get_ohlcv(symbol, '1d', limit=250)
             price = df['close'].iloc[-1]
             news = get_news(name)
             indicators, tech_text = build_indicators(df, price)
@@ -346,14 +292,12 @@ def fetch_market_data(send_alert=True):
     """
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"},
-            temperature=0.1
-        )
+        # Unchanged indicators + headlines since a recent run → cached answer
+        llm_inputs = {name: {'price': block['price'], 'news': block['news_text'], 'indicators': block['indicators']}
+                      for name, block in asset_blocks.items()}
+        content = complete_json(client, prompt, llm_inputs, model="gpt-4o-mini", temperature=0.1)
         
-        analisis_final = json.loads(response.choices[0].message.content)
+        analisis_final = json.loads(content)
         
         mensaje = "📊 *Reporte Quant Triple* 📊\n\n"
         db_data = []
@@ -1,25 +1,55 @@
 import argparse
-import time
+import asyncio
 import datetime
-import ccxt
-from utils.db import (
-    insert_sentiment,
-    insert_sr_levels,
-    insert_rsi_divergences,
-    insert_fvgs,
-    insert_trade_confluences
-)
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.db import get_write_queue
+from utils.market_data import get_market_data_client
+from utils import ohlcv_cache
+from utils.ohlcv_cache import get_ohlcv
 
 # Importamos los módulos de los scripts
 from fetch_data import fetch_market_data, send_telegram
-from sr_scanner import scan_symbol as scan_sr
+from sr_scanner import plan_symbol as plan_sr
 from rsi_divergence import scan_market as scan_rsi
 from smc_scanner import scan_smc as scan_smc_levels
 
+SCAN_TIMEFRAMES = ['15m', '1h', '4h', '1d', '1w']
+
+# ── Escaneo por temporalidad ──────────────────────────────────────────
+# Cada TF corre de forma independiente: sus top-10 S/R se guardan
+# con confluence=['15m'] (o lo que corresponda), así el frontend
+# puede filtrar "solo 1W" o "solo 4h" sin contaminación de otras TFs.
+# Después hacemos un escaneo multi-TF para detectar confluencias reales.
+TF_CONFIGS = {
+    '15m': {'limit': 1000, 'top_n': 10},
+    '1h':  {'limit': 1000, 'top_n': 10},
+    '4h':  {'limit': 1000, 'top_n': 10},
+    '1d':  {'limit': 1000, 'top_n': 10},
+    '1w':  {'limit': 1000, 'top_n': 10},  # Binance devuelve lo disponible si hay menos
+}
+
+# Candles prefetched per (symbol, TF): covers every scanner's own limit
+PREFETCH_LIMIT = 1000
+# Concurrent OHLCV downloads; the shared weight bucket does the real pacing
+FETCH_CONCURRENCY = 16
+# Workers read the candles the parent prefetched for this run instead of
+# refetching them (their own clients would not share the parent's budget)
+WORKER_CACHE_TTL = 15 * 60
+
+def get_current_prices(symbols):
+    """Last price for every symbol with a single batched ticker request."""
+    try:
+        return get_market_data_client().fetch_prices(symbols)
+    except Exception as e:
+        print(f"Error obteniendo precios de {', '.join(symbols)}: {e}")
+        return {}
+
 def get_current_price(symbol):
     try:
-        exchange = ccxt.binance()
-        ticker = exchange.fetch_ticker(symbol)
+        ticker = get_market_data_client().fetch_ticker(symbol)
         return ticker['last']
     except Exception as e:
         print(f"Error obteniendo precio de {symbol}: {e}")
@@ -121,105 +151,145 @@ def analyze_confluences(symbol, price, sentiment_list, sr_list, rsi_list, smc_li
         
     return confluences
 
-def main():
-    parser = argparse.ArgumentParser(description="Orquestador Maestro Quant")
-    parser.add_argument("--symbols", nargs="+", default=["BTC/USDT", "ETH/USDT"], help="Símbolos a escanear")
-    args = parser.parse_args()
-    
-    print("🚀 Iniciando Orquestador Maestro Quant...")
-    
-    # 1. Extraer Sentimiento Global (1 solo request)
-    print("\n[Paso 1] Extrayendo Sentimiento Macro y de Noticias...")
-    sentiment_data = fetch_market_data(send_alert=False)
-    if sentiment_data:
-        insert_sentiment(sentiment_data)
-        
-    all_confluences = []
-    
-    # 2. Iterar por cada activo pasando por los otros 3 Motores
-    for symbol in args.symbols:
-        print(f"\n==========================================")
-        print(f"🔄 PROCESANDO ACTIVO: {symbol}")
-        print(f"==========================================")
-        
-        current_price = get_current_price(symbol)
-        if not current_price: continue
-            
-        print("\n[Paso 2] Escaneando Muros Cuantitativos ATR (por temporalidad)...")
-        
-        # ── Escaneo por temporalidad ──────────────────────────────────────────
-        # Cada TF corre de forma independiente: sus top-10 S/R se guardan
-        # con confluence=['15m'] (o lo que corresponda), así el frontend
-        # puede filtrar "solo 1W" o "solo 4h" sin contaminación de otras TFs.
-        # Después hacemos un escaneo multi-TF para detectar confluencias reales.
-        
-        TF_CONFIGS = {
-            '15m': {'limit': 1000, 'top_n': 10},
-            '1h':  {'limit': 1000, 'top_n': 10},
-            '4h':  {'limit': 1000, 'top_n': 10},
-            '1d':  {'limit': 1000, 'top_n': 10},
-            '1w':  {'limit': 1000, 'top_n': 10},  # Binance devuelve lo disponible si hay menos
-        }
-        
-        all_sr_data = []
-        for tf, cfg in TF_CONFIGS.items():
+# ── Etapas CPU (corren en el process pool) ──────────────────────────────
+def _init_worker(cache_ttl):
+    ohlcv_cache.CACHE_TTL = cache_ttl
+
+# Stages run strict: a failed download raises, so process_symbol keeps the
+# stored snapshot instead of replacing it with a partial (or empty) scan
+def run_sr(symbol):
+    """Per-TF and multi-TF S/R from a single download and fractal pass per TF."""
+    plan = plan_sr(symbol, TF_CONFIGS, multi_limit=1000, multi_top_n=5, strict=True)
+    all_sr_data = []
+    for tf, tf_data in plan['per_tf'].items():
+        # Etiquetamos como escaneo aislado por TF
+        for row in tf_data:
+            row['source_run'] = 'per_tf'
+        all_sr_data.extend(tf_data)
+    # Escaneo multi-TF para detectar confluencias inter-temporalidad
+    for row in plan['multi_tf']:
+        row['source_run'] = 'multi_tf'
+    all_sr_data.extend(plan['multi_tf'])
+    return all_sr_data
+
+def run_rsi(symbol):
+    return scan_rsi([symbol], SCAN_TIMEFRAMES, historical=False, strict=True) or []
+
+def run_smc(symbol):
+    return scan_smc_levels([symbol], SCAN_TIMEFRAMES, limit=500, strict=True) or []
+
+# Table each scanner stage persists to
+STAGE_TABLES = {'sr': "support_resistance_levels", 'rsi': "rsi_divergences", 'smc': "fair_value_gaps"}
+
+# ── Pipeline async ──────────────────────────────────────────────────────
+async def prefetch_symbol(symbol, fetch_sem):
+    """Warm the OHLCV cache for every TF of `symbol` through the shared client."""
+    async def fetch(tf):
+        async with fetch_sem:
             try:
-                tf_data = scan_sr(symbol, [tf], cfg['limit'], cfg['top_n'])
-                if tf_data:
-                    # Etiquetamos como escaneo aislado por TF
-                    for row in tf_data:
-                        row['source_run'] = 'per_tf'
-                    all_sr_data.extend(tf_data)
-                    print(f"   ✅ {tf}: {len(tf_data)} muros")
-                time.sleep(0.5)
+                await asyncio.to_thread(get_ohlcv, symbol, tf, PREFETCH_LIMIT)
             except Exception as e:
-                print(f"   ⚠️ Error en SR/{tf}: {e}")
-        
-        # Escaneo multi-TF para detectar confluencias inter-temporalidad
-        try:
-            multi_tf_data = scan_sr(symbol, list(TF_CONFIGS.keys()), 1000, 5)
-            if multi_tf_data:
-                for row in multi_tf_data:
-                    row['source_run'] = 'multi_tf'
-                all_sr_data.extend(multi_tf_data)
-                print(f"   🏆 Multi-TF: {len(multi_tf_data)} confluencias")
-        except Exception as e:
-            print(f"   ⚠️ Error en SR/multi-TF: {e}")
-        
-        if all_sr_data:
-            insert_sr_levels(all_sr_data)
-        
-        time.sleep(1) # Rate limit protection
+                print(f"   ⚠️ Error descargando {symbol} {tf}: {e}")
+    await asyncio.gather(*(fetch(tf) for tf in SCAN_TIMEFRAMES))
 
-        
-        print("\n[Paso 3] Escaneando Divergencias RSI...")
-        rsi_data = scan_rsi([symbol], ['15m', '1h', '4h', '1d', '1w'], historical=False)
-        if rsi_data: insert_rsi_divergences(rsi_data)
-        
-        time.sleep(1) # Rate limit protection
-        
-        print("\n[Paso 4] Escaneando Fair Value Gaps (SMC)...")
-        smc_data = scan_smc_levels([symbol], ['15m', '1h', '4h', '1d', '1w'], limit=500)
-        if smc_data: insert_fvgs(smc_data)
-        
-        print("\n[Paso 5] Buscando Confluencias de Alta Probabilidad...")
-        confs = analyze_confluences(symbol, current_price, sentiment_data, all_sr_data or [], rsi_data or [], smc_data or [])
-        
+async def process_symbol(symbol, pool, fetch_sem, writer):
+    """
+    Prefetch one symbol's candles, run its SR/RSI/FVG stages in parallel and
+    hand the results to the write-behind queue without waiting for the DB.
+    """
+    await prefetch_symbol(symbol, fetch_sem)
+
+    loop = asyncio.get_running_loop()
+    stages = {'sr': run_sr, 'rsi': run_rsi, 'smc': run_smc}
+    results = await asyncio.gather(*(loop.run_in_executor(pool, fn, symbol) for fn in stages.values()),
+                                   return_exceptions=True)
+
+    scan = {'symbol': symbol, 'failed': set()}
+    for name, result in zip(stages, results):
+        if isinstance(result, Exception):
+            print(f"   ⚠️ Error en {name.upper()} ({symbol}): {result}")
+            scan['failed'].add(name)
+            result = []
+        else:
+            # A completed scan replaces the symbol's snapshot even when empty;
+            # a failed stage (any TF download or scan error) leaves it untouched
+            writer.submit(STAGE_TABLES[name], result, symbols=[symbol])
+        scan[name] = result
+    return scan
+
+async def fetch_sentiment(writer):
+    sentiment_data = await asyncio.to_thread(fetch_market_data, False)
+    if sentiment_data:
+        writer.submit("sentiment_analysis", sentiment_data)
+    return sentiment_data
+
+async def run_pipeline(symbols, workers, fetch_concurrency):
+    """
+    Fan out every symbol (and every scanner stage) at once. Candles are
+    downloaded in this process under the shared rate limiter; the CPU-bound
+    scans run in a process pool reading them from the OHLCV cache. Results
+    are persisted by a write-behind queue as they arrive.
+    """
+    writer = get_write_queue()
+
+    # 1. Sentimiento global en paralelo con el escaneo de activos
+    print("\n[Paso 1] Extrayendo Sentimiento Macro y de Noticias...")
+    sentiment_task = asyncio.create_task(fetch_sentiment(writer))
+
+    prices = await asyncio.to_thread(get_current_prices, symbols)
+    missing = [s for s in symbols if not prices.get(s)]
+    for symbol, price in zip(missing, await asyncio.gather(*(asyncio.to_thread(get_current_price, s) for s in missing))):
+        if price:
+            prices[symbol] = price
+    active = [s for s in symbols if prices.get(s)]
+
+    # 2-4. S/R, RSI y FVG de todos los activos a la vez
+    print(f"\n[Pasos 2-4] Escaneando {len(active)} activos (S/R, RSI, FVG) con {workers} procesos...")
+    fetch_sem = asyncio.Semaphore(fetch_concurrency)
+    # spawn: workers must not inherit the parent's client threads/locks mid-request
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(WORKER_CACHE_TTL,)) as pool:
+        scans = await asyncio.gather(*(process_symbol(s, pool, fetch_sem, writer) for s in active))
+
+    sentiment_data = await sentiment_task
+
+    # 5. Confluencias por activo
+    print("\n[Paso 5] Buscando Confluencias de Alta Probabilidad...")
+    all_confluences = []
+    for scan in scans:
+        symbol = scan['symbol']
+        confs = analyze_confluences(symbol, prices[symbol], sentiment_data or [], scan['sr'], scan['rsi'], scan['smc'])
         if confs:
             all_confluences.extend(confs)
             for c in confs:
                 print(f"🔥 ¡CONFLUENCIA {c['setup_type']} DETECTADA EN {c['symbol']}! Score: {c['score']}/10")
         else:
             print(f"💤 Ninguna confluencia fuerte en {symbol} en este momento.")
-            
-        time.sleep(2) # Rate limit prevention between symbols
+
+    if all_confluences:
+        writer.submit("trade_confluences", all_confluences)
+
+    # Drain pending writes before reporting "Datos actualizados en Supabase"
+    await asyncio.to_thread(writer.close)
+
+    return all_confluences
+
+def main():
+    parser = argparse.ArgumentParser(description="Orquestador Maestro Quant")
+    parser.add_argument("--symbols", nargs="+", default=["BTC/USDT", "ETH/USDT"], help="Símbolos a escanear")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Procesos para el escaneo CPU")
+    parser.add_argument("--fetch-concurrency", type=int, default=FETCH_CONCURRENCY, help="Descargas OHLCV simultáneas")
+    args = parser.parse_args()
+    
+    print("🚀 Iniciando Orquestador Maestro Quant...")
+    all_confluences = asyncio.run(run_pipeline(args.symbols, args.workers, args.fetch_concurrency))
         
     # ── Reporte final siempre se envía por Telegram ─────────────────────────
     # Así siempre sabes que el bot corrió aunque no haya confluencias.
     hora = datetime.datetime.now().strftime('%H:%M')
     
     if all_confluences:
-        insert_trade_confluences(all_confluences)
         mensaje = f"\ud83d\udc51 *ALERTA DEL ORQUESTADOR QUANT* ({hora}) \ud83d\udc51\n\n"
         for c in all_confluences:
             emoji = "\ud83d\ude80" if c['setup_type'] == 'LONG' else "\ud83e\ude78"
@@ -1,13 +1,16 @@
-import ccxt
 import pandas as pd
 import numpy as np
 from scipy.signal import argrelextrema
 import argparse
 
+from utils.ohlcv_cache import get_ohlcv
+from utils.indicators import calculate_rsi
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
 def fetch_ohlcv(symbol, timeframe, limit=300):
-    exchange = ccxt.binance({'enableRateLimit': True})
-    bars = exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
-    df = pd.DataFrame(bars, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    # Shared on-disk cache: only bars newer than the last cached close hit Binance
+    df = get_ohlcv(symbol, timeframe, limit=limit)
     
     # Conversión de UTC a Hora Local (Colombia UTC-5)
     df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
@@ -15,81 +18,104 @@ def fetch_ohlcv(symbol, timeframe, limit=300):
     
     return df
 
-def calculate_rsi(series, period=14):
-    """RSI using Wilder's RMA (matches TradingView / industry standard)."""
-    delta = series.diff(1)
-    gain = delta.where(delta > 0, 0)
-    loss = -delta.where(delta < 0, 0)
-    # Wilder's smoothing: EMA with com=period-1 (equivalent to alpha=1/period)
-    avg_gain = gain.ewm(com=period - 1, min_periods=period).mean()
-    avg_loss = loss.ewm(com=period - 1, min_periods=period).mean()
-    rs = avg_gain / avg_loss
-    return 100 - (100 / (1 + rs))
-
-def check_divergences(df, order=5, historical=False, lookback_window=60):
+def _macro_pivot_pairs(pivots, values, lookback_window):
+    """
+    Para cada pivote (desde el segundo) el pivote previo con mayor `values`
+    (el primero si hay empate) a <= lookback_window velas. Devuelve
+    (current, major) en posiciones de df, sólo de pivotes con algún previo.
+    Ventana móvil vectorizada: matriz pivote × previos de a lo sumo
+    lookback_window columnas y argmax por fila.
+    """
+    pivots = np.asarray(pivots, dtype=np.int64)
+    m = len(pivots)
+    empty = np.empty(0, dtype=np.int64)
+    if m < 2:
+        return empty, empty
+
+    rows = np.arange(m)
+    first_prev = np.searchsorted(pivots, pivots - lookback_window, side='left')
+    width = int((rows - first_prev).max())
+    if width <= 0:
+        return empty, empty
+
+    # Columna c ↔ pivote previo j = i - width + c (j crece con c)
+    prev = rows[:, None] - width + np.arange(width)[None, :]
+    in_window = (prev >= first_prev[:, None]) & (prev >= 0)
+    candidates = np.where(in_window, values[pivots[np.clip(prev, 0, None)]], -np.inf)
+    major_col = np.argmax(candidates, axis=1)
+
+    has_prev = in_window.any(axis=1)
+    current = pivots[has_prev]
+    major = pivots[prev[rows, major_col][has_prev]]
+    return current, major
+
+def divergence_rows(df, rsi):
+    """
+    Máscara (alineada con df) de las velas que analiza check_divergences:
+    las que tienen OHLCV y RSI, o sea sin el calentamiento del RSI.
+    """
+    columns = [c for c in OHLCV_COLUMNS if c in df.columns]
+    return df[columns].notna().all(axis=1).to_numpy() & ~np.isnan(np.asarray(rsi, dtype=np.float64))
+
+def check_divergences(df, order=5, historical=False, lookback_window=60, rsi=None, pivots=None):
     """
     lookback_window=60: Miramos hasta 60 velas atrás para encontrar 
     el VERDADERO pico/valle institucional, ignorando el ruido del medio.
+    rsi: RSI ya calculado y alineado con df (p.ej. la columna precalculada
+    del backtest o la del motor en vivo); si no se pasa se calcula aquí.
+    pivots: (max_pos, min_pos) posiciones de pivotes en df, p.ej. de un
+    StreamingPivotDetector; si no se pasan se buscan con argrelextrema.
+    df no se modifica, así que no hace falta pasar una copia.
     """
-    df['rsi'] = calculate_rsi(df['close'])
-    df = df.dropna().reset_index(drop=True)
+    rsi_values = np.asarray(calculate_rsi(df['close']) if rsi is None else rsi, dtype=np.float64)
+    kept = divergence_rows(df, rsi_values)
+    rows = np.flatnonzero(kept)   # posición en df de cada vela analizada
+
+    high = df['high'].values[rows]
+    low = df['low'].values[rows]
+    rsi_values = rsi_values[rows]
+
+    if pivots is not None:
+        # Posiciones de df → posiciones entre las velas analizadas
+        new_pos = np.cumsum(kept) - 1
+        positions = []
+        for idx in pivots:
+            idx = np.asarray(idx, dtype=np.int64)
+            positions.append(new_pos[idx[kept[idx]]])
+        local_max, local_min = positions
+    else:
+        local_max = argrelextrema(high, np.greater_equal, order=order)[0]
+        local_min = argrelextrema(low, np.less_equal, order=order)[0]
 
-    local_max = argrelextrema(df['high'].values, np.greater_equal, order=order)[0]
-    local_min = argrelextrema(df['low'].values, np.less_equal, order=order)[0]
+    current_idx = len(rows) - 1
+    timestamps = df['timestamp']
 
     divergences = []
-    current_idx = len(df) - 1
-
-    # Detección Bajista (Oso)
-    for i in range(1, len(local_max)):
-        idx_current = local_max[i]
-        is_active = (current_idx - idx_current <= order + 2)
-        
-        if not historical and not is_active:
-            continue
-            
-        valid_prev_peaks = [p for p in local_max[:i] if (idx_current - p) <= lookback_window]
-        if not valid_prev_peaks: continue
-            
-        idx_major = max(valid_prev_peaks, key=lambda p: df['high'].iloc[p])
-        
-        if df['high'].iloc[idx_current] > df['high'].iloc[idx_major] and df['rsi'].iloc[idx_current] < df['rsi'].iloc[idx_major]:
-            estado = "ACTIVA 🔥" if is_active else "HISTÓRICA 🕰️"
-            divergences.append({
-                "estado": estado,
-                "tipo": "🔴 BAJISTA (Macro)",
-                "precio": df['high'].iloc[idx_current],
-                "rsi": df['rsi'].iloc[idx_current],
-                "fecha": df['timestamp'].iloc[idx_current].strftime('%Y-%m-%d %H:%M')
-            })
+    # Detección Bajista (Oso): máximo más alto con RSI más bajo
+    # Detección Alcista (Toro): mínimo más bajo con RSI más alto
+    for tipo, extremes, price, sign in (("🔴 BAJISTA (Macro)", local_max, high, 1),
+                                        ("🟢 ALCISTA (Macro)", local_min, low, -1)):
+        current, major = _macro_pivot_pairs(extremes, sign * price, lookback_window)
+        is_active = (current_idx - current <= order + 2)
+        hit = (sign * price[current] > sign * price[major]) & (sign * rsi_values[current] < sign * rsi_values[major])
+        if not historical:
+            hit &= is_active
 
-    # Detección Alcista (Toro)
-    for i in range(1, len(local_min)):
-        idx_current = local_min[i]
-        is_active = (current_idx - idx_current <= order + 2)
-        
-        if not historical and not is_active:
-            continue
-            
-        valid_prev_valleys = [p for p in local_min[:i] if (idx_current - p) <= lookback_window]
-        if not valid_prev_valleys: continue
-            
-        idx_major = min(valid_prev_valleys, key=lambda p: df['low'].iloc[p])
-        
-        if df['low'].iloc[idx_current] < df['low'].iloc[idx_major] and df['rsi'].iloc[idx_current] > df['rsi'].iloc[idx_major]:
-            estado = "ACTIVA 🔥" if is_active else "HISTÓRICA 🕰️"
+        fechas = pd.DatetimeIndex(timestamps.iloc[rows[current[hit]]]).strftime('%Y-%m-%d %H:%M')
+        for idx, active, fecha in zip(current[hit].tolist(), is_active[hit].tolist(), fechas):
             divergences.append({
-                "estado": estado,
-                "tipo": "🟢 ALCISTA (Macro)",
-                "precio": df['low'].iloc[idx_current],
-                "rsi": df['rsi'].iloc[idx_current],
-                "fecha": df['timestamp'].iloc[idx_current].strftime('%Y-%m-%d %H:%M')
+                "estado": "ACTIVA 🔥" if active else "HISTÓRICA 🕰️",
+                "tipo": tipo,
+                "precio": price[idx],
+                "rsi": rsi_values[idx],
+                "fecha": fecha
             })
 
     unique_divs = {d['fecha']: d for d in divergences}.values()
     return sorted(unique_divs, key=lambda x: x['fecha'], reverse=True)
 
-def scan_market(symbols, timeframes, historical):
+def scan_market(symbols, timeframes, historical, strict=False):
+    """Divergencias de cada (símbolo, TF); con `strict` un TF que falla aborta el escaneo."""
     all_db_data = []
     for symbol in symbols:
         print(f"\n--- 🔎 Radar RSI (Lookback Dinámico) para {symbol} ---")
@@ -116,6 +142,8 @@ def scan_market(symbols, timeframes, historical):
                         })
             except Exception as e:
                 print(f"Error procesando {tf}: {e}")
+                if strict:
+                    raise
         if not found_any:
             print("✅ No hay divergencias macro detectadas con los parámetros actuales.")
             
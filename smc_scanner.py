@@ -1,11 +1,15 @@
-import ccxt
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+
+import numpy as np
 import pandas as pd
 import argparse
 
+from utils.ohlcv_cache import get_ohlcv
+
 def fetch_ohlcv(symbol, timeframe, limit=500):
-    exchange = ccxt.binance({'enableRateLimit': True})
-    bars = exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
-    df = pd.DataFrame(bars, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    # Shared on-disk cache: only bars newer than the last cached close hit Binance
+    df = get_ohlcv(symbol, timeframe, limit=limit)
     
     # Conversión de UTC a Hora Local (Colombia UTC-5)
     df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
@@ -13,67 +17,148 @@ def fetch_ohlcv(symbol, timeframe, limit=500):
     
     return df
 
+def detect_fvgs(high, low):
+    """
+    Todos los huecos de 3 velas de una serie, mitigados o no, como arrays:
+    (idx de la vela 3, es_alcista, techo, piso), en orden de formación.
+    """
+    # Alcista (Toro): el bajo de la vela 3 no alcanza a tocar el alto de la vela 1
+    bull = low[2:] > high[:-2]
+    # Bajista (Oso): el alto de la vela 3 no alcanza a tocar el bajo de la vela 1
+    bear = ~bull & (high[2:] < low[:-2])
+
+    idx = np.flatnonzero(bull | bear) + 2
+    is_bull = bull[idx - 2]
+    techo = np.where(is_bull, low[idx], low[idx - 2])
+    piso = np.where(is_bull, high[idx - 2], high[idx])
+    return idx, is_bull, techo, piso
+
 def find_unmitigated_fvgs(df):
-    fvgs = []
-    
+    """
+    Huecos de 3 velas (FVG) que el precio todavía no rellenó, en orden de
+    formación. Vectorizado: los huecos salen de comparar arrays desplazados
+    y la mitigación del mínimo/máximo acumulado desde el final de la serie.
+    """
+    if len(df) < 3:
+        return []
+
+    high = df['high'].to_numpy(dtype=np.float64)
+    low = df['low'].to_numpy(dtype=np.float64)
+
     # 1. Escanear todo el historial buscando los huecos de 3 velas
-    for i in range(2, len(df)):
-        vela1_high = df['high'].iloc[i-2]
-        vela1_low = df['low'].iloc[i-2]
-        vela2_time = df['timestamp'].iloc[i-1]
-        vela3_high = df['high'].iloc[i]
-        vela3_low = df['low'].iloc[i]
-        
-        # Condición FVG Alcista (Toro): El bajo de la vela 3 no alcanza a tocar el alto de la vela 1
-        if vela3_low > vela1_high:
-            fvgs.append({
-                'tipo': '🟢 FVG ALCISTA',
-                'techo': vela3_low,
-                'piso': vela1_high,
-                'fecha': vela2_time,
-                'idx_formacion': i,
-                'mitigado': False
-            })
-            
-        # Condición FVG Bajista (Oso): El alto de la vela 3 no alcanza a tocar el bajo de la vela 1
-        elif vela3_high < vela1_low:
-            fvgs.append({
-                'tipo': '🔴 FVG BAJISTA',
-                'techo': vela1_low,
-                'piso': vela3_high,
-                'fecha': vela2_time,
-                'idx_formacion': i,
-                'mitigado': False
-            })
-
-    # 2. Comprobar si el mercado ya rellenó (mitigó) el hueco con velas posteriores
+    idx, is_bull, techo, piso = detect_fvgs(high, low)
+
+    # 2. Mitigación: mínimo (alcista) / máximo (bajista) de todas las velas
+    # posteriores a la formación; fmin/fmax ignoran velas con NaN igual que
+    # las comparaciones vela a vela
+    future_low = np.r_[np.fmin.accumulate(low[::-1])[::-1], np.inf]
+    future_high = np.r_[np.fmax.accumulate(high[::-1])[::-1], -np.inf]
+    # Alcista rellenado si el precio bajó hasta el piso; bajista si subió hasta el techo
+    mitigado = np.where(is_bull, future_low[idx + 1] <= piso, future_high[idx + 1] >= techo)
+
+    timestamps = df['timestamp']
     unmitigated_fvgs = []
-    for fvg in fvgs:
-        mitigado = False
-        # Escaneamos desde la vela donde se formó hasta el precio actual
-        for j in range(fvg['idx_formacion'] + 1, len(df)):
-            if fvg['tipo'] == '🟢 FVG ALCISTA':
-                # Si el precio bajó más allá del piso del gap, está rellenado
-                if df['low'].iloc[j] <= fvg['piso']:
-                    mitigado = True
-                    break
-            elif fvg['tipo'] == '🔴 FVG BAJISTA':
-                # Si el precio subió más allá del techo del gap, está rellenado
-                if df['high'].iloc[j] >= fvg['techo']:
-                    mitigado = True
-                    break
-                    
-        if not mitigado:
-            unmitigated_fvgs.append(fvg)
-            
+    for i, bull, top, bottom in zip(idx[~mitigado].tolist(), is_bull[~mitigado],
+                                    techo[~mitigado], piso[~mitigado]):
+        unmitigated_fvgs.append({
+            'tipo': '🟢 FVG ALCISTA' if bull else '🔴 FVG BAJISTA',
+            'techo': top,
+            'piso': bottom,
+            'fecha': timestamps.iloc[i - 1],
+            'idx_formacion': i,
+            'mitigado': False
+        })
+
     return unmitigated_fvgs
 
+class FVGTracker:
+    """
+    FVGs abiertos de una serie (símbolo, TF) alimentada vela a vela.
+
+    Cada vela cerrada sólo puede crear un hueco nuevo y mitigar huecos ya
+    abiertos, así que no hace falta reescanear el historial: los huecos
+    alcistas se guardan ordenados por piso y los bajistas por techo, y una
+    vela sólo toca (bisect) los que su rango cruza. `gaps(start)` devuelve
+    lo mismo que find_unmitigated_fvgs sobre las velas [start, count), con
+    idx_formacion contado desde `start`; un buffer que descarta sus velas
+    más viejas llama a discard_before() para no acumular huecos que ya no ve.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._prev = deque(maxlen=2)   # (high, low, timestamp) de las 2 velas anteriores
+        self._bull = []                # (piso, idx) ordenados
+        self._bear = []                # (techo, idx) ordenados
+        self._open = {}                # idx → fvg, en orden de formación
+
+    def update(self, high, low, timestamp):
+        """Ingest one closed candle: mitigate open gaps, then detect a new one."""
+        high, low = float(high), float(low)
+        i = self.count
+
+        # Alcistas con piso >= low quedan rellenados (la cola de la lista);
+        # una vela con NaN no mitiga nada, igual que la comparación escalar
+        cut = bisect_left(self._bull, (low,)) if low == low else len(self._bull)
+        for _, idx in self._bull[cut:]:
+            del self._open[idx]
+        del self._bull[cut:]
+
+        # Bajistas con techo <= high quedan rellenados (la cabeza de la lista)
+        cut = bisect_right(self._bear, (high, float('inf'))) if high == high else 0
+        for _, idx in self._bear[:cut]:
+            del self._open[idx]
+        del self._bear[:cut]
+
+        if len(self._prev) == 2:
+            vela1_high, vela1_low, _ = self._prev[0]
+            vela2_time = self._prev[1][2]
+            if low > vela1_high:
+                self._open[i] = {'tipo': '🟢 FVG ALCISTA', 'techo': low, 'piso': vela1_high,
+                                 'fecha': vela2_time, 'idx_formacion': i, 'mitigado': False}
+                insort(self._bull, (vela1_high, i))
+            elif high < vela1_low:
+                self._open[i] = {'tipo': '🔴 FVG BAJISTA', 'techo': vela1_low, 'piso': high,
+                                 'fecha': vela2_time, 'idx_formacion': i, 'mitigado': False}
+                insort(self._bear, (vela1_low, i))
+
+        self._prev.append((high, low, timestamp))
+        self.count += 1
+
+    def feed(self, df, stop=None):
+        """Ingest the rows of `df` not seen yet, up to position `stop` (exclusive)."""
+        stop = len(df) if stop is None else stop
+        if stop <= self.count:
+            return
+        rows = df.iloc[self.count:stop]
+        for high, low, ts in zip(rows['high'].to_numpy(dtype=np.float64),
+                                 rows['low'].to_numpy(dtype=np.float64),
+                                 list(rows['timestamp'])):
+            self.update(high, low, ts)
+
+    def discard_before(self, start):
+        """Forget gaps whose first candle is before candle `start` (trimmed off a buffer)."""
+        if not self._open or next(iter(self._open)) >= start + 2:
+            return
+        self._open = {idx: fvg for idx, fvg in self._open.items() if idx >= start + 2}
+        self._bull = [gap for gap in self._bull if gap[1] in self._open]
+        self._bear = [gap for gap in self._bear if gap[1] in self._open]
+
+    def gaps(self, start=0):
+        """
+        Currently unmitigated gaps formed entirely within candles [start,
+        count), oldest first, with idx_formacion counted from `start`.
+        """
+        return [{**fvg, 'idx_formacion': idx - start}
+                for idx, fvg in self._open.items() if idx >= start + 2]
+
+
 def format_price(price):
     if price < 0.001: return f"{price:.8f}"
     elif price < 1: return f"{price:.4f}"
     else: return f"{price:,.2f}"
 
-def scan_smc(symbols, timeframes, limit):
+def scan_smc(symbols, timeframes, limit, strict=False):
+    """FVGs abiertos de cada (símbolo, TF); con `strict` un TF que falla aborta el escaneo."""
     all_db_data = []
     for symbol in symbols:
         print(f"\n--- 🐋 Radar SMC (Fair Value Gaps) para {symbol} ---")
@@ -138,6 +223,8 @@ def scan_smc(symbols, timeframes, limit):
                     
             except Exception as e:
                 print(f"Error procesando {tf}: {e}")
+                if strict:
+                    raise
                 
     return all_db_data
 
@@ -1,79 +1,92 @@
-import ccxt
 import pandas as pd
 import numpy as np
 from scipy.signal import argrelextrema
 import argparse
 
+from utils.ohlcv_cache import get_ohlcv
+from utils.indicators import calculate_atr_pct
+
 def fetch_ohlcv(symbol, timeframe, limit=1000):
-    exchange = ccxt.binance({'enableRateLimit': True})
-    bars = exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
-    df = pd.DataFrame(bars, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    # Shared on-disk cache: only bars newer than the last cached close hit Binance
+    df = get_ohlcv(symbol, timeframe, limit=limit)
     
     # Conversión de UTC a Hora Local (Colombia UTC-5)
     df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
     df['timestamp'] = df['timestamp'].dt.tz_localize('UTC').dt.tz_convert('America/Bogota')
     return df
 
-def calculate_atr_pct(df, period=14):
-    high_low = df['high'] - df['low']
-    high_close = np.abs(df['high'] - df['close'].shift())
-    low_close = np.abs(df['low'] - df['close'].shift())
-    ranges = pd.concat([high_low, high_close, low_close], axis=1)
-    
-    true_range = ranges.max(axis=1)
-    atr = true_range.rolling(period).mean()
-    atr_pct = atr.iloc[-1] / df['close'].iloc[-1]
-    return atr_pct
-
-def get_fractal_extremes(df, tf, order=10):
-    local_max = argrelextrema(df['high'].values, np.greater_equal, order=order)[0]
-    local_min = argrelextrema(df['low'].values, np.less_equal, order=order)[0]
+def get_fractal_extremes(df, tf, order=10, pivots=None):
+    """
+    Fractales (precio, tf) de df. `pivots`: (max_pos, min_pos) ya conocidos,
+    p.ej. de un StreamingPivotDetector, para no correr argrelextrema.
+    """
+    if pivots is not None:
+        local_max, local_min = pivots
+    else:
+        local_max = argrelextrema(df['high'].values, np.greater_equal, order=order)[0]
+        local_min = argrelextrema(df['low'].values, np.less_equal, order=order)[0]
 
     resistances = [(df['high'].iloc[i], tf) for i in local_max]
     supports = [(df['low'].iloc[i], tf) for i in local_min]
     return supports, resistances
 
 def cluster_levels(levels, threshold_pct):
+    """
+    Agrupa niveles (precio, tf) ordenados por precio: cada nivel entra al
+    cluster actual si está a <= threshold_pct de su media, que se lleva como
+    suma y conteo acumulados. Las estadísticas de cada cluster (media, rango,
+    toques por TF) salen de group-bys NumPy sobre los cortes del cluster.
+    """
     if not levels: return []
-    
-    levels = sorted(levels, key=lambda x: x[0])
-    clusters = []
-    current_cluster = [levels[0]]
 
-    for level in levels[1:]:
-        precio_actual = level[0]
-        mean_c = np.mean([item[0] for item in current_cluster])
-        
-        if abs(precio_actual - mean_c) / mean_c <= threshold_pct:
-            current_cluster.append(level)
+    prices = np.array([item[0] for item in levels], dtype=np.float64)
+    tfs = np.array([str(item[1]) for item in levels])
+    order = np.argsort(prices, kind='stable')
+    prices = prices[order]
+    tf_names, tf_codes = np.unique(tfs[order], return_inverse=True)
+
+    # Único paso secuencial: decidir dónde empieza cada cluster
+    starts = [0]
+    total, count = float(prices[0]), 1
+    for i, precio_actual in enumerate(prices[1:].tolist(), start=1):
+        mean_c = total / count
+        if mean_c != 0 and abs(precio_actual - mean_c) / mean_c <= threshold_pct:
+            total += precio_actual
+            count += 1
         else:
-            clusters.append(current_cluster)
-            current_cluster = [level]
-    clusters.append(current_cluster)
+            starts.append(i)
+            total, count = precio_actual, 1
+
+    starts = np.asarray(starts)
+    sizes = np.diff(np.r_[starts, len(prices)])
+    means = np.add.reduceat(prices, starts) / sizes
+    min_prices = np.minimum.reduceat(prices, starts)
+    max_prices = np.maximum.reduceat(prices, starts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        widths_pct = (max_prices - min_prices) / min_prices * 100
+
+    # Toques por (cluster, TF) y primera aparición de cada TF en el cluster
+    cluster_ids = np.repeat(np.arange(len(starts)), sizes)
+    touches = np.zeros((len(starts), len(tf_names)), dtype=np.int64)
+    np.add.at(touches, (cluster_ids, tf_codes), 1)
+    first_seen = np.full(touches.shape, len(prices))
+    np.minimum.at(first_seen, (cluster_ids, tf_codes), np.arange(len(prices)))
 
     final_levels = []
-    for c in clusters:
-        if len(c) >= 2:
-            precios = [item[0] for item in c]
-            temporalidades = list(set([item[1] for item in c]))
-            min_price = np.min(precios)
-            max_price = np.max(precios)
-            width_pct = ((max_price - min_price) / min_price) * 100
-
-            # Count touches per TF
-            touches_by_tf = {}
-            for item in c:
-                tf = item[1]
-                touches_by_tf[tf] = touches_by_tf.get(tf, 0) + 1
-            
-            final_levels.append({
-                'precio_linea': np.mean(precios),
-                'toques': len(c),
-                'touches_by_tf': touches_by_tf,
-                'confluencia': temporalidades,
-                'grosor_pct': width_pct,
-                'tipo_zona': "Línea exacta" if width_pct <= (threshold_pct*100/2) else "Zona ancha"
-            })
+    for c in np.flatnonzero(sizes >= 2).tolist():
+        present = np.flatnonzero(touches[c])
+        present = present[np.argsort(first_seen[c, present])]
+        touches_by_tf = {str(tf_names[t]): int(touches[c, t]) for t in present.tolist()}
+        width_pct = widths_pct[c]
+
+        final_levels.append({
+            'precio_linea': means[c],
+            'toques': int(sizes[c]),
+            'touches_by_tf': touches_by_tf,
+            'confluencia': list(touches_by_tf),
+            'grosor_pct': width_pct,
+            'tipo_zona': "Línea exacta" if width_pct <= (threshold_pct*100/2) else "Zona ancha"
+        })
             
     return final_levels
 
@@ -86,40 +99,77 @@ def format_price(price):
     else:
         return f"{price:,.2f}"
 
-def scan_symbol(symbol, timeframes, limit, max_results):
-    print(f"\n--- 🎯 Muros Cuantitativos Dinámicos (ATR) para {symbol} ---")
-    
+def fractal_order(tf):
+    if tf in ['15m', '1h']: return 20
+    elif tf == '4h': return 10
+    elif tf == '1d': return 5
+    elif tf == '1w': return 3
+    return 5
+
+def load_timeframes(symbol, limits, strict=False):
+    """
+    Fetch every TF once. `limits` maps tf → candles; failed TFs are skipped,
+    or re-raised with `strict` so a partial download never passes for a scan.
+    """
+    frames = {}
+    for tf, limit in limits.items():
+        try:
+            frames[tf] = fetch_ohlcv(symbol, tf, limit=limit)
+        except Exception as e:
+            print(f"Error extrayendo {tf}: {e}")
+            if strict:
+                raise
+    return frames
+
+def atr_threshold(symbol, frames):
+    """Clustering threshold from the daily ATR, reusing an already fetched 1d series."""
     try:
-        daily_df = fetch_ohlcv(symbol, '1d', limit=60)
+        daily_df = frames.get('1d')
+        if daily_df is None:
+            daily_df = fetch_ohlcv(symbol, '1d', limit=60)
         volatilidad_diaria_pct = calculate_atr_pct(daily_df, period=14)
         dynamic_threshold = volatilidad_diaria_pct * 0.25 
         print(f"Volatilidad Diaria (ATR): {volatilidad_diaria_pct*100:.2f}% | Umbral de Agrupación: {dynamic_threshold*100:.2f}%")
     except Exception as e:
         print(f"Error calculando ATR: {e}. Usando default 0.8%")
         dynamic_threshold = 0.008
+    return dynamic_threshold
 
+class FractalCache:
+    """Fractal extremes per (tf, candles), computed at most once per series."""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self._cache = {}
+
+    def get(self, tf, limit):
+        df = self.frames[tf]
+        key = (tf, min(limit, len(df)))
+        if key not in self._cache:
+            try:
+                self._cache[key] = get_fractal_extremes(df.iloc[-limit:], tf, order=fractal_order(tf))
+            except Exception as e:
+                print(f"Error extrayendo {tf}: {e}")
+                self._cache[key] = ([], [])
+        return self._cache[key]
+
+def rank_levels(symbol, timeframes, frames, fractals, limit, max_results, threshold):
+    """Cluster the fractals of `timeframes` and return the nearest S/R rows for the DB."""
     print(f"Analizando confluencia en: {', '.join(timeframes)} | Velas por TF: {limit}")
     
     all_supports = []
     all_resistances = []
     
     for tf in timeframes:
-        try:
-            df = fetch_ohlcv(symbol, tf, limit=limit)
-            if tf in ['15m', '1h']: order = 20
-            elif tf == '4h': order = 10
-            elif tf == '1d': order = 5
-            elif tf == '1w': order = 3
-            else: order = 5
-                
-            sup, res = get_fractal_extremes(df, tf, order=order)
-            all_supports.extend(sup)
-            all_resistances.extend(res)
-        except Exception as e:
-            print(f"Error extrayendo {tf}: {e}")
+        if tf not in frames:
+            continue
+        sup, res = fractals.get(tf, limit)
+        all_supports.extend(sup)
+        all_resistances.extend(res)
 
-    key_levels = cluster_levels(all_supports + all_resistances, threshold_pct=dynamic_threshold)
-    current_price = fetch_ohlcv(symbol, timeframes[0], limit=1)['close'].iloc[0]
+    key_levels = cluster_levels(all_supports + all_resistances, threshold_pct=threshold)
+    price_tf = next(tf for tf in timeframes if tf in frames)
+    current_price = frames[price_tf]['close'].iloc[-1]
     print(f"Precio Actual: ${format_price(current_price)}\n")
     
     print(f"🧱 TOP {max_results} RESISTENCIAS MÁS CERCANAS (Hacia arriba):")
@@ -162,6 +212,36 @@ def scan_symbol(symbol, timeframes, limit, max_results):
             
     return db_data
 
+def scan_symbol(symbol, timeframes, limit, max_results):
+    print(f"\n--- 🎯 Muros Cuantitativos Dinámicos (ATR) para {symbol} ---")
+    frames = load_timeframes(symbol, {tf: limit for tf in timeframes})
+    threshold = atr_threshold(symbol, frames)
+    if not frames:
+        return []
+    return rank_levels(symbol, timeframes, frames, FractalCache(frames), limit, max_results, threshold)
+
+def plan_symbol(symbol, tf_configs, multi_limit=1000, multi_top_n=5, strict=False):
+    """
+    Per-TF scans (`tf_configs`: {tf: {'limit', 'top_n'}}) plus the multi-TF
+    confluence scan over the same TFs, sharing one download per TF, one daily
+    ATR and one fractal pass per (TF, candles). With `strict` a failed
+    download raises instead of leaving its TF out.
+    Returns {'per_tf': {tf: rows}, 'multi_tf': rows}.
+    """
+    print(f"\n--- 🎯 Muros Cuantitativos Dinámicos (ATR) para {symbol} ---")
+    timeframes = list(tf_configs.keys())
+    frames = load_timeframes(symbol, {tf: max(cfg['limit'], multi_limit) for tf, cfg in tf_configs.items()}, strict)
+    threshold = atr_threshold(symbol, frames)
+    fractals = FractalCache(frames)
+
+    plan = {'per_tf': {}, 'multi_tf': []}
+    for tf, cfg in tf_configs.items():
+        if tf in frames:
+            plan['per_tf'][tf] = rank_levels(symbol, [tf], frames, fractals, cfg['limit'], cfg['top_n'], threshold)
+    if frames:
+        plan['multi_tf'] = rank_levels(symbol, timeframes, frames, fractals, multi_limit, multi_top_n, threshold)
+    return plan
+
 if __name__ == "__main__":
     import sys
     import os
@@ -0,0 +1,36 @@
+"""Shared fixtures: import paths and fixed random OHLCV series."""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'backtesting'))
+
+
+def random_ohlcv(bars, seed, tick=5.0):
+    """Random-walk 15m candles; prices rounded to `tick` so ties (equal highs/lows) occur."""
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.002, bars)))
+    spread = np.abs(rng.normal(0, 0.0015, bars)) * close
+    open_ = np.r_[close[0], close[:-1]]
+    df = pd.DataFrame({
+        'timestamp': pd.date_range('2024-01-01', periods=bars, freq='15min'),
+        'open': open_,
+        'high': np.maximum(open_, close) + spread,
+        'low': np.minimum(open_, close) - spread,
+        'close': close,
+        'volume': rng.gamma(2.0, 50.0, bars),
+    })
+    for col in ('open', 'high', 'low', 'close'):
+        df[col] = (df[col] / tick).round() * tick
+    return df
+
+
+@pytest.fixture
+def ohlcv():
+    return random_ohlcv
@@ -0,0 +1,49 @@
+"""sync_rows on a local SQLite backend: drifting S/R levels are updated in place."""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils import db
+from utils.storage import SQLiteBackend
+
+TABLE = "support_resistance_levels"
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    backend = SQLiteBackend(str(tmp_path / 'quant.db'))
+    monkeypatch.setattr(db, '_storage', backend)
+    return backend
+
+
+def levels(prices, touches=3):
+    return [{'symbol': 'BTC/USDT', 'source_run': 'per_tf', 'is_support': price < 67000,
+             'price_level': price, 'touches': touches, 'confluence': ['1h'],
+             'thickness_pct': 0.2, 'zone_type': 'Línea exacta'} for price in prices]
+
+
+def test_drifting_levels_are_updated_not_replaced(storage):
+    first = levels([65000.0, 66000.0, 68000.0, 69000.0])
+    assert db.sync_rows(TABLE, first)['inserted'] == 4
+    ids = sorted(row['id'] for row in storage.select_by_symbols(TABLE, ['BTC/USDT']))
+
+    # Cluster means moved a few dollars; one level vanished and a new one appeared
+    stats = db.sync_rows(TABLE, levels([65012.5, 66003.1, 68007.9, 71000.0]))
+    assert stats == {'inserted': 1, 'updated': 3, 'deleted': 1, 'unchanged': 0}
+
+    stored = storage.select_by_symbols(TABLE, ['BTC/USDT'])
+    assert sorted(row['price_level'] for row in stored) == [65012.5, 66003.1, 68007.9, 71000.0]
+    assert len({row['id'] for row in stored} & set(ids)) == 3
+
+    assert db.sync_rows(TABLE, levels([65012.5, 66003.1, 68007.9, 71000.0]))['unchanged'] == 4
+
+
+def test_close_levels_pair_with_their_own_previous_row(storage):
+    db.sync_rows(TABLE, levels([66000.0]) + levels([66010.0], touches=7))
+    stats = db.sync_rows(TABLE, levels([66000.0]) + levels([66010.0], touches=7))
+    assert stats == {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 2}
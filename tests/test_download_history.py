@@ -0,0 +1,56 @@
+"""update_tf against a fake exchange: only holes the exchange confirms empty are recorded."""
+
+import os
+import sys
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'backtesting'))
+
+from download_history import TF_MS, update_tf
+
+TF = '1h'
+STEP = TF_MS[TF]
+
+
+class FakeExchange:
+    """Serves bars for every hour in `bars_at`; requests starting inside `down` raise."""
+
+    def __init__(self, bars_at, down=()):
+        self.bars_at = sorted(bars_at)
+        self.down = down
+
+    def fetch_ohlcv(self, symbol, timeframe, since=None, limit=1000):
+        if any(start <= since < end for start, end in self.down):
+            raise TimeoutError('429 Too Many Requests')
+        return [[ts, 1.0, 2.0, 0.5, 1.5, 10.0] for ts in self.bars_at if ts >= since][:limit]
+
+
+def frame(hours):
+    return pd.DataFrame([[h * STEP, 1.0, 2.0, 0.5, 1.5, 10.0] for h in hours],
+                        columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+
+
+def test_exchange_hole_is_confirmed():
+    # Hours 5-6 are missing locally and on the exchange
+    hours = [h for h in range(20) if h not in (5, 6)]
+    df, stats = update_tf(FakeExchange([h * STEP for h in hours]), 'BTC/USDT', TF, frame(hours), 100)
+    assert stats['holes'] == [(5 * STEP, 7 * STEP)]
+    assert stats['failed'] == 0
+
+
+def test_failed_backfill_stays_unconfirmed():
+    # The exchange has hours 5-6, but the backfill request fails
+    existing = frame([h for h in range(20) if h not in (5, 6)])
+    exchange = FakeExchange([h * STEP for h in range(20)], down=[(5 * STEP, 7 * STEP)])
+    df, stats = update_tf(exchange, 'BTC/USDT', TF, existing, 100)
+    assert stats['holes'] == []
+    assert stats['failed'] == 1
+
+    # Not passed as known, so the next run requests it again and fills it
+    df, stats = update_tf(FakeExchange([h * STEP for h in range(20)]), 'BTC/USDT', TF, df, 100,
+                          known_gaps=stats['holes'])
+    assert list(df['timestamp']) == [h * STEP for h in range(20)]
+    assert stats['holes'] == []
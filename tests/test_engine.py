@@ -0,0 +1,38 @@
+"""FVGLifetimeIndex against find_unmitigated_fvgs rerun on every closed-candle prefix."""
+
+import numpy as np
+import pytest
+
+from benchmarks.bench_fvg import legacy_find_unmitigated_fvgs
+from engine import FVGLifetimeIndex, scan_fvg_multi_tf
+from smc_scanner import find_unmitigated_fvgs
+
+
+def gaps_of(index, positions):
+    return [('🟢 FVG ALCISTA' if index.is_bull[g] else '🔴 FVG BAJISTA', index.top[g], index.bottom[g])
+            for g in positions.tolist()]
+
+
+def scanned_gaps(scan, df):
+    return [(f['tipo'], f['techo'], f['piso']) for f in scan(df)]
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_unmitigated_matches_legacy_scan_on_every_prefix(ohlcv, seed):
+    df = ohlcv(250, seed)
+    index = FVGLifetimeIndex(df)
+    ts = df['timestamp'].values
+    for length in range(1, len(df) + 1):
+        # The legacy loop is quadratic: check it on a sample of prefixes
+        scan = legacy_find_unmitigated_fvgs if length % 25 == 0 else find_unmitigated_fvgs
+        expected = scanned_gaps(scan, df.iloc[:length])
+        assert gaps_of(index, index.unmitigated_prefix(length)) == expected
+        assert gaps_of(index, index.unmitigated(ts[length - 1])) == expected
+
+
+def test_scan_fvg_multi_tf_same_with_and_without_index(ohlcv):
+    datasets = {'15m': ohlcv(600, seed=5), '1h': ohlcv(400, seed=6)}
+    fvg_index = {tf: FVGLifetimeIndex(df) for tf, df in datasets.items()}
+    for current_time in datasets['1h']['timestamp'].iloc[::37]:
+        assert (scan_fvg_multi_tf(datasets, current_time, fvg_index=fvg_index)
+                == scan_fvg_multi_tf(datasets, current_time))
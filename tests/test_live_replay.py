@@ -0,0 +1,88 @@
+"""
+Replay of the bundled 15m data through LivePaperEngine buffers, past the
+MAX_BUFFER_CANDLES trim, checking the streaming state against the scanners
+run on the buffer itself.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.signal import argrelextrema
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'backtesting'))
+
+import live_engine
+from smc_scanner import find_unmitigated_fvgs
+from utils.pivots import StreamingPivotDetector
+
+DATA = os.path.join(ROOT, 'backtesting', 'data', 'BTCUSDT_30d', '15m.csv')
+
+
+def replay(engine, tf='15m', every=7):
+    """Feed every candle of the dataset to `engine`, yielding the buffer frame every `every` closes."""
+    df = pd.read_csv(DATA)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    assert len(df) > live_engine.MAX_BUFFER_CANDLES
+    columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+    for n, row in enumerate(df[columns].itertuples(index=False), start=1):
+        engine._append_candle(tf, row._asdict())
+        if n % every == 0 and n >= 30:
+            yield engine.buffers[tf].frame()
+
+
+@pytest.fixture
+def engine():
+    return live_engine.LivePaperEngine()
+
+
+def test_fvg_tracker_matches_buffer_scan_across_trims(engine):
+    trimmed = False
+    for frame in replay(engine):
+        tracker = engine.fvg_trackers['15m']
+        trimmed |= tracker.count > len(frame)
+        expected = find_unmitigated_fvgs(frame)
+        assert tracker.gaps(start=tracker.count - len(frame)) == expected
+        # Gaps older than the buffer are dropped, not just hidden
+        assert len(tracker.gaps()) == len(expected)
+        assert (live_engine.scan_fvg_from_buffers({'15m': frame}, 0, engine.fvg_trackers)
+                == live_engine.scan_fvg_from_buffers({'15m': frame}, 0))
+    assert trimmed
+
+
+def test_buffer_pivots_match_argrelextrema_across_trims(engine):
+    order = live_engine.ORDER_MAP['15m']
+    detector = engine.pivot_detectors[('15m', order)] = StreamingPivotDetector(order)
+    trimmed = False
+    for frame in replay(engine):
+        trimmed |= detector.count > len(frame)
+        max_pos, min_pos = live_engine.buffer_pivots(engine.pivot_detectors, '15m', order, frame)
+        np.testing.assert_array_equal(
+            max_pos, argrelextrema(frame['high'].values, np.greater_equal, order=order)[0])
+        np.testing.assert_array_equal(
+            min_pos, argrelextrema(frame['low'].values, np.less_equal, order=order)[0])
+    assert trimmed
+
+
+def test_divergence_pivots_match_argrelextrema_on_valid_rsi_rows(engine):
+    order = live_engine.ORDER_MAP['15m']
+    engine.pivot_detectors[('15m', order)] = StreamingPivotDetector(order)
+    warmup_seen = trimmed = False
+    for frame in replay(engine):
+        rsi = frame['rsi']
+        kept = np.flatnonzero(live_engine.divergence_rows(frame, rsi))
+        warmup_seen |= kept[0] > 0
+        trimmed |= kept[0] == 0
+        max_pos, min_pos = live_engine.divergence_pivots(engine.pivot_detectors, '15m', order, frame, rsi)
+        np.testing.assert_array_equal(
+            max_pos, kept[argrelextrema(frame['high'].values[kept], np.greater_equal, order=order)[0]])
+        np.testing.assert_array_equal(
+            min_pos, kept[argrelextrema(frame['low'].values[kept], np.less_equal, order=order)[0]])
+        assert (live_engine.check_divergences(frame, order=order, historical=True, rsi=rsi,
+                                              pivots=(max_pos, min_pos))
+                == live_engine.check_divergences(frame, order=order, historical=True, rsi=rsi))
+    assert warmup_seen and trimmed
@@ -0,0 +1,42 @@
+"""llm_cache keys: only an identical prompt and inputs reuse a cached answer."""
+
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils import llm_cache
+
+
+def prompt_for(price, rsi):
+    return f"BTC a ${price:,.2f}, RSI 1h {rsi:.1f}. Responde en JSON."
+
+
+def test_nearby_market_states_get_different_keys():
+    key = lambda price, rsi: llm_cache.cache_key('gpt-4o-mini', 0.1, prompt_for(price, rsi),
+                                                 {'price': price, 'rsi': rsi})
+    assert key(67050.0, 70.4) == key(67050.0, 70.4)
+    assert key(67050.0, 70.4) != key(67149.0, 70.4)
+    assert key(67050.0, 70.4) != key(67050.0, 70.5)
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, **kwargs):
+        self.calls += 1
+        content = json.dumps({'prompt': messages[0]['content']})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def test_complete_json_reuses_only_identical_prompts(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, 'LLM_CACHE_PATH', str(tmp_path / 'llm.sqlite'))
+    client = FakeClient()
+    for price in (67050.0, 67050.0, 67149.0):
+        llm_cache.complete_json(client, prompt_for(price, 70.4), {'price': price})
+    assert client.calls == 2
@@ -0,0 +1,52 @@
+"""Concurrent get_ohlcv calls for one (symbol, TF) inside a single process."""
+
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils import ohlcv_cache
+
+DAY_MS = 86_400_000
+
+
+class SlowExchange:
+    """Serves the latest daily bars, slowly enough for threads to overlap."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def parse_timeframe(self, timeframe):
+        return DAY_MS // 1000
+
+    def milliseconds(self):
+        return 3000 * DAY_MS
+
+    def fetch_ohlcv(self, symbol, timeframe, since=None, limit=1000):
+        self.calls += 1
+        time.sleep(0.05)
+        return [[i * DAY_MS, 1.0, 2.0, 0.5, 1.5, 10.0] for i in range(3000 - limit, 3000)]
+
+
+def test_concurrent_reads_share_one_fetch_and_one_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(ohlcv_cache, 'CACHE_DIR', str(tmp_path))
+    exchange = SlowExchange()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(ohlcv_cache.get_ohlcv('BTC/USDT', '1d', 250, exchange)))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # The first thread fills the cache; the rest read it while it is fresh
+    assert exchange.calls == 1
+    assert all(len(df) == 250 for df in results)
+    assert os.listdir(tmp_path / 'BTCUSDT') == ['1d.csv']
+    stored = pd.read_csv(tmp_path / 'BTCUSDT' / '1d.csv')
+    assert list(stored['timestamp']) == [i * DAY_MS for i in range(2750, 3000)]
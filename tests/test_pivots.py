@@ -0,0 +1,42 @@
+"""PivotTimeline against argrelextrema rerun on every closed-candle prefix."""
+
+import numpy as np
+import pytest
+from scipy.signal import argrelextrema
+
+from engine import build_pivot_index
+from rsi_divergence import divergence_rows
+from utils.indicators import calculate_rsi
+from utils.pivots import PivotTimeline
+
+
+def legacy_pivots(high, low, order):
+    return (argrelextrema(high, np.greater_equal, order=order)[0],
+            argrelextrema(low, np.less_equal, order=order)[0])
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('order', [3, 5, 10])
+def test_visible_matches_argrelextrema_on_every_prefix(ohlcv, seed, order):
+    df = ohlcv(300, seed)
+    high, low, ts = df['high'].values, df['low'].values, df['timestamp'].values
+    timeline = PivotTimeline(high, low, ts, order)
+    for length in range(1, len(df) + 1):
+        expected = legacy_pivots(high[:length], low[:length], order)
+        for got in (timeline.visible(ts[length - 1]), timeline.visible_prefix(length)):
+            np.testing.assert_array_equal(got[0], expected[0])
+            np.testing.assert_array_equal(got[1], expected[1])
+
+
+def test_rsi_timeline_matches_argrelextrema_after_rsi_warmup(ohlcv):
+    df = ohlcv(300, seed=4)
+    df.loc[[40, 41, 150], 'high'] = np.nan   # rows check_divergences also drops
+    index = build_pivot_index({'15m': df})['rsi']['15m']
+    order = index.order
+    kept = np.flatnonzero(divergence_rows(df, calculate_rsi(df['close'])))
+    for length in range(1, len(df) + 1):
+        rows = kept[kept < length]
+        expected = legacy_pivots(df['high'].values[rows], df['low'].values[rows], order)
+        got = index.visible_prefix(length)
+        np.testing.assert_array_equal(got[0], rows[expected[0]])
+        np.testing.assert_array_equal(got[1], rows[expected[1]])
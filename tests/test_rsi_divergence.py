@@ -0,0 +1,75 @@
+"""check_divergences against the per-pivot loop it replaced."""
+
+import numpy as np
+import pytest
+from scipy.signal import argrelextrema
+
+from rsi_divergence import check_divergences
+from utils.indicators import calculate_rsi
+
+
+def legacy_check_divergences(df, order=5, historical=False, lookback_window=60):
+    df['rsi'] = calculate_rsi(df['close'])
+    df = df.dropna().reset_index(drop=True)
+
+    local_max = argrelextrema(df['high'].values, np.greater_equal, order=order)[0]
+    local_min = argrelextrema(df['low'].values, np.less_equal, order=order)[0]
+
+    divergences = []
+    current_idx = len(df) - 1
+
+    for i in range(1, len(local_max)):
+        idx_current = local_max[i]
+        is_active = (current_idx - idx_current <= order + 2)
+        if not historical and not is_active:
+            continue
+        valid_prev_peaks = [p for p in local_max[:i] if (idx_current - p) <= lookback_window]
+        if not valid_prev_peaks: continue
+        idx_major = max(valid_prev_peaks, key=lambda p: df['high'].iloc[p])
+        if df['high'].iloc[idx_current] > df['high'].iloc[idx_major] and df['rsi'].iloc[idx_current] < df['rsi'].iloc[idx_major]:
+            divergences.append({
+                "estado": "ACTIVA 🔥" if is_active else "HISTÓRICA 🕰️",
+                "tipo": "🔴 BAJISTA (Macro)",
+                "precio": df['high'].iloc[idx_current],
+                "rsi": df['rsi'].iloc[idx_current],
+                "fecha": df['timestamp'].iloc[idx_current].strftime('%Y-%m-%d %H:%M')
+            })
+
+    for i in range(1, len(local_min)):
+        idx_current = local_min[i]
+        is_active = (current_idx - idx_current <= order + 2)
+        if not historical and not is_active:
+            continue
+        valid_prev_valleys = [p for p in local_min[:i] if (idx_current - p) <= lookback_window]
+        if not valid_prev_valleys: continue
+        idx_major = min(valid_prev_valleys, key=lambda p: df['low'].iloc[p])
+        if df['low'].iloc[idx_current] < df['low'].iloc[idx_major] and df['rsi'].iloc[idx_current] > df['rsi'].iloc[idx_major]:
+            divergences.append({
+                "estado": "ACTIVA 🔥" if is_active else "HISTÓRICA 🕰️",
+                "tipo": "🟢 ALCISTA (Macro)",
+                "precio": df['low'].iloc[idx_current],
+                "rsi": df['rsi'].iloc[idx_current],
+                "fecha": df['timestamp'].iloc[idx_current].strftime('%Y-%m-%d %H:%M')
+            })
+
+    unique_divs = {d['fecha']: d for d in divergences}.values()
+    return sorted(unique_divs, key=lambda x: x['fecha'], reverse=True)
+
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('order', [3, 5])
+@pytest.mark.parametrize('historical', [True, False])
+def test_check_divergences_matches_legacy(ohlcv, seed, order, historical):
+    df = ohlcv(1500, seed)
+    new = check_divergences(df, order=order, historical=historical)
+    old = legacy_check_divergences(df.copy(), order=order, historical=historical)
+    assert new == old
+    if historical:
+        assert len(new) > 0
+
+
+def test_check_divergences_does_not_modify_df(ohlcv):
+    df = ohlcv(300, seed=1)
+    before = df.copy()
+    check_divergences(df, order=3, historical=True)
+    assert df.equals(before)
@@ -0,0 +1,21 @@
+"""find_unmitigated_fvgs and FVGTracker against the loop scan they replaced."""
+
+import pytest
+
+from benchmarks.bench_fvg import legacy_find_unmitigated_fvgs
+from smc_scanner import FVGTracker, find_unmitigated_fvgs
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_find_unmitigated_fvgs_matches_legacy(ohlcv, seed):
+    df = ohlcv(600, seed)
+    assert find_unmitigated_fvgs(df) == legacy_find_unmitigated_fvgs(df)
+
+
+def test_fvg_tracker_matches_rescan_on_every_prefix(ohlcv):
+    df = ohlcv(400, seed=11)
+    tracker = FVGTracker()
+    for n in range(1, len(df) + 1):
+        tracker.feed(df, stop=n)
+        assert tracker.gaps() == find_unmitigated_fvgs(df.iloc[:n])
+    assert tracker.gaps() == legacy_find_unmitigated_fvgs(df)
@@ -0,0 +1,76 @@
+"""cluster_levels against the per-level np.mean clustering it replaced."""
+
+import numpy as np
+import pytest
+
+from sr_scanner import cluster_levels, get_fractal_extremes
+
+
+def legacy_cluster_levels(levels, threshold_pct):
+    if not levels: return []
+
+    levels = sorted(levels, key=lambda x: x[0])
+    clusters = []
+    current_cluster = [levels[0]]
+
+    for level in levels[1:]:
+        precio_actual = level[0]
+        mean_c = np.mean([item[0] for item in current_cluster])
+
+        if abs(precio_actual - mean_c) / mean_c <= threshold_pct:
+            current_cluster.append(level)
+        else:
+            clusters.append(current_cluster)
+            current_cluster = [level]
+    clusters.append(current_cluster)
+
+    final_levels = []
+    for c in clusters:
+        if len(c) >= 2:
+            precios = [item[0] for item in c]
+            temporalidades = list(set([item[1] for item in c]))
+            min_price = np.min(precios)
+            max_price = np.max(precios)
+            width_pct = ((max_price - min_price) / min_price) * 100
+
+            touches_by_tf = {}
+            for item in c:
+                tf = item[1]
+                touches_by_tf[tf] = touches_by_tf.get(tf, 0) + 1
+
+            final_levels.append({
+                'precio_linea': np.mean(precios),
+                'toques': len(c),
+                'touches_by_tf': touches_by_tf,
+                'confluencia': temporalidades,
+                'grosor_pct': width_pct,
+                'tipo_zona': "Línea exacta" if width_pct <= (threshold_pct*100/2) else "Zona ancha"
+            })
+
+    return final_levels
+
+
+def fractal_levels(ohlcv, seed):
+    levels = []
+    for offset, (tf, order) in enumerate([('15m', 3), ('1h', 3), ('4h', 5), ('1d', 5)]):
+        supports, resistances = get_fractal_extremes(ohlcv(800, seed * 10 + offset), tf, order=order)
+        levels += supports + resistances
+    return levels
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('threshold', [0.001, 0.004, 0.01, 0.03])
+def test_cluster_levels_matches_legacy(ohlcv, seed, threshold):
+    levels = fractal_levels(ohlcv, seed)
+    new, old = cluster_levels(levels, threshold), legacy_cluster_levels(levels, threshold)
+    assert len(new) == len(old)
+    for a, b in zip(new, old):
+        assert a['precio_linea'] == pytest.approx(b['precio_linea'], rel=1e-12)
+        assert a['grosor_pct'] == pytest.approx(b['grosor_pct'], rel=1e-12)
+        assert (a['toques'], a['touches_by_tf'], a['tipo_zona']) == (b['toques'], b['touches_by_tf'], b['tipo_zona'])
+        # The legacy TF list came from a set; only its contents are defined
+        assert sorted(a['confluencia']) == sorted(b['confluencia'])
+
+
+def test_cluster_levels_empty():
+    assert cluster_levels([], 0.01) == legacy_cluster_levels([], 0.01) == []
@@ -1,74 +1,354 @@
+import atexit
 import os
-from supabase import create_client, Client
+import threading
+import time
+from datetime import datetime
 from dotenv import load_dotenv
 
+try:
+    from supabase import create_client, Client
+except ImportError:  # Only the Supabase backend needs it (DB_BACKEND=sqlite works without)
+    create_client, Client = None, None
+
+from utils.storage import SupabaseBackend, SQLiteBackend, WRITE_CHUNK
+
 load_dotenv()
 
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
 
+# "supabase" (default) or "sqlite" (local file at SQLITE_PATH)
+DB_BACKEND = os.environ.get("DB_BACKEND", "supabase").lower()
+STORAGE_LABEL = "SQLite" if DB_BACKEND == "sqlite" else "Supabase"
+
+# Write-behind queue: flush a table once it holds this many rows or its
+# oldest pending write is this many seconds old
+QUEUE_FLUSH_ROWS = WRITE_CHUNK
+QUEUE_FLUSH_INTERVAL = float(os.environ.get("DB_FLUSH_INTERVAL", 2.0))
+QUEUE_MAX_RETRIES = 4
+QUEUE_BACKOFF = 1.0     # seconds, doubled on every retry
+
+# Natural key of each snapshot table: a row with the same key is the same level/gap/divergence
+NATURAL_KEYS = {
+    "support_resistance_levels": ('symbol', 'source_run', 'is_support'),
+    "rsi_divergences": ('symbol', 'timeframe', 'type', 'divergence_date'),
+    "fair_value_gaps": ('symbol', 'timeframe', 'type', 'fvg_date'),
+}
+DATE_FIELDS = {'divergence_date', 'fvg_date'}
+
+# Tables whose key alone does not identify a row: rows sharing a key are
+# paired on `field` when it differs by at most `tolerance` (relative). An
+# S/R level is a cluster mean that drifts a little with every new candle,
+# so it is updated in place rather than deleted and reinserted.
+MATCH_TOLERANCE = {
+    "support_resistance_levels": ('price_level', 0.005),
+}
+
+_client = None
+_client_lock = threading.Lock()
+_storage = None
+
 def get_supabase_client() -> Client:
+    """Process-wide Supabase client (created once, reused by every writer)."""
+    global _client
+    if _client is not None:
+        return _client
     if not SUPABASE_URL or not SUPABASE_KEY:
         print("⚠️ Advertencia: No se encontraron las credenciales de Supabase en las variables de entorno.")
         return None
-    try:
-        return create_client(SUPABASE_URL, SUPABASE_KEY)
-    except Exception as e:
-        print(f"Error conectando a Supabase: {e}")
+    if create_client is None:
+        print("⚠️ Advertencia: paquete supabase no instalado (usa DB_BACKEND=sqlite para trabajar offline).")
         return None
+    with _client_lock:
+        if _client is None:
+            try:
+                _client = create_client(SUPABASE_URL, SUPABASE_KEY)
+            except Exception as e:
+                print(f"Error conectando a Supabase: {e}")
+                return None
+    return _client
 
-def insert_sentiment(data_list):
+def get_storage():
+    """Storage backend selected by DB_BACKEND (None when Supabase is unavailable)."""
+    global _storage
+    if _storage is not None:
+        return _storage
+    if DB_BACKEND == "sqlite":
+        with _client_lock:
+            if _storage is None:
+                _storage = SQLiteBackend()
+        return _storage
     client = get_supabase_client()
-    if not client or not data_list: return
+    if not client:
+        return None
+    _storage = SupabaseBackend(client)
+    return _storage
+
+def _batch_symbols(data_list):
+    """Distinct symbols of a (possibly multi-symbol) batch of rows."""
+    return sorted({row['symbol'] for row in data_list if row.get('symbol')})
+
+# ── Bulk writer ──────────────────────────────────────────────────────────
+def _normalize(field, value):
+    """Comparable form of a value as we send it and as the backend returns it."""
+    if value is None:
+        return None
+    if field in DATE_FIELDS:
+        try:
+            return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None).isoformat(sep=' ')
+        except ValueError:
+            return str(value)
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return round(float(value), 8)
+    if isinstance(value, (list, tuple)):
+        return tuple(sorted(str(v) for v in value))
+    return value
+
+def _row_key(row, key_fields):
+    return tuple(_normalize(f, row.get(f)) for f in key_fields)
+
+def _changed(new_row, old_row):
+    return any(_normalize(f, v) != _normalize(f, old_row.get(f)) for f, v in new_row.items())
+
+def _pair_rows(new_rows, old_rows, field, tolerance):
+    """
+    Pair rows of one key whose `field` is within `tolerance` (relative),
+    closest first and preferring pairs that agree on every other field.
+    Returns ([(new, old), ...], unpaired new rows, unpaired old rows).
+    """
+    candidates = []
+    for i, new in enumerate(new_rows):
+        for j, old in enumerate(old_rows):
+            a, b = float(new[field]), float(old.get(field) or 0)
+            distance = abs(a - b) / max(abs(a), abs(b), 1e-12)
+            if distance <= tolerance:
+                candidates.append((_changed({k: v for k, v in new.items() if k != field}, old), distance, i, j))
+    pairs, used_new, used_old = [], set(), set()
+    for _, _, i, j in sorted(candidates):
+        if i not in used_new and j not in used_old:
+            pairs.append((new_rows[i], old_rows[j]))
+            used_new.add(i)
+            used_old.add(j)
+    return (pairs, [r for i, r in enumerate(new_rows) if i not in used_new],
+            [r for j, r in enumerate(old_rows) if j not in used_old])
+
+def sync_rows(table, data_list, symbols=None):
+    """
+    Make `table` hold exactly `data_list` for the given symbols (default:
+    those present in the batch). Rows are matched on NATURAL_KEYS[table]
+    (plus MATCH_TOLERANCE[table] where the key is shared by several rows):
+    new keys are inserted, changed rows upserted by id, unchanged rows left
+    alone and rows that vanished deleted.
+    Returns {'inserted', 'updated', 'deleted', 'unchanged'} or None.
+    """
+    storage = get_storage()
+    symbols = sorted(set(symbols or []) | set(_batch_symbols(data_list)))
+    if not storage or not symbols: return None
+
+    key_fields = NATURAL_KEYS[table]
+    tolerance = MATCH_TOLERANCE.get(table)
+    if tolerance is None:
+        # One row per key: later copies in the batch win
+        new_groups = {key: [row] for key, row in {_row_key(r, key_fields): r for r in data_list}.items()}
+    else:
+        new_groups = {}
+        for row in data_list:
+            new_groups.setdefault(_row_key(row, key_fields), []).append(row)
+
+    current = {}
+    stale_ids = []
+    for row in storage.select_by_symbols(table, symbols):
+        rows = current.setdefault(_row_key(row, key_fields), [])
+        if rows and tolerance is None:
+            stale_ids.append(row['id'])  # Duplicates left by older writers
+        else:
+            rows.append(row)
+
+    to_insert, to_update, unchanged = [], [], 0
+    for key, rows in new_groups.items():
+        old_rows = current.pop(key, [])
+        if tolerance is None:
+            pairs = list(zip(rows, old_rows))
+            new_only, old_only = rows[len(pairs):], old_rows[len(pairs):]
+        else:
+            pairs, new_only, old_only = _pair_rows(rows, old_rows, *tolerance)
+        to_insert.extend(new_only)
+        stale_ids.extend(old['id'] for old in old_only)
+        for row, old in pairs:
+            if _changed(row, old):
+                to_update.append({**row, 'id': old['id']})
+            else:
+                unchanged += 1
+    stale_ids.extend(row['id'] for rows in current.values() for row in rows)
+
+    # Write before deleting so readers never see an empty snapshot
+    if to_update:
+        storage.upsert(table, to_update)
+    if to_insert:
+        storage.insert(table, to_insert)
+    if stale_ids:
+        storage.delete_ids(table, stale_ids)
+
+    return {'inserted': len(to_insert), 'updated': len(to_update), 'deleted': len(stale_ids), 'unchanged': unchanged}
+
+def _sync_summary(stats):
+    return (f"{stats['inserted']} nuevos, {stats['updated']} actualizados, "
+            f"{stats['deleted']} eliminados, {stats['unchanged']} sin cambios")
+
+def write_rows(table, data_list, symbols=None):
+    """Write one batch (raising on failure): synced snapshot tables or plain appends."""
+    if table in NATURAL_KEYS:
+        return sync_rows(table, data_list, symbols)
+    storage = get_storage()
+    if not storage or not data_list: return None
+    storage.insert(table, data_list)
+    return {'inserted': len(data_list), 'updated': 0, 'deleted': 0, 'unchanged': 0}
+
+# ── Write-behind queue ───────────────────────────────────────────────────
+class WriteBehindQueue:
+    """
+    Background writer: submit() returns immediately and a worker thread
+    flushes each table when it reaches `flush_rows` rows or `flush_interval`
+    seconds. Pending writes to a snapshot table are coalesced per symbol
+    (the latest batch wins); append tables are concatenated. Failed flushes
+    are retried with exponential backoff; close() drains everything.
+    """
+
+    def __init__(self, flush_rows=QUEUE_FLUSH_ROWS, flush_interval=QUEUE_FLUSH_INTERVAL,
+                 max_retries=QUEUE_MAX_RETRIES, backoff=QUEUE_BACKOFF):
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._pending = {}   # table -> {'since', 'rows' (append) | 'by_symbol' (snapshot)}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='db-write-behind', daemon=True)
+        self._thread.start()
+
+    def submit(self, table, data_list, symbols=None):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("WriteBehindQueue cerrada")
+            entry = self._pending.setdefault(table, {'since': time.monotonic(), 'rows': [], 'by_symbol': {}})
+            if table in NATURAL_KEYS:
+                # A newer snapshot of a symbol replaces the one still waiting
+                for symbol in set(symbols or []) | set(_batch_symbols(data_list)):
+                    entry['by_symbol'][symbol] = []
+                for row in data_list:
+                    entry['by_symbol'][row['symbol']].append(row)
+            else:
+                entry['rows'].extend(data_list)
+            if self._size(entry) >= self.flush_rows:
+                self._cond.notify()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self, timeout=None):
+        """Flush every pending write and stop the worker."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    @staticmethod
+    def _size(entry):
+        return len(entry['rows']) + sum(len(rows) for rows in entry['by_symbol'].values())
+
+    def _take_due(self):
+        now = time.monotonic()
+        due = [table for table, entry in self._pending.items()
+               if self._closed or self._size(entry) >= self.flush_rows
+               or now - entry['since'] >= self.flush_interval]
+        return [(table, self._pending.pop(table)) for table in due]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                batch = self._take_due()
+                while not batch:
+                    if self._closed and not self._pending:
+                        return
+                    self._cond.wait(timeout=self.flush_interval)
+                    batch = self._take_due()
+            for table, entry in batch:
+                self._flush(table, entry)
+
+    def _flush(self, table, entry):
+        rows = entry['rows'] + [row for rows in entry['by_symbol'].values() for row in rows]
+        symbols = sorted(entry['by_symbol'])
+        for attempt in range(self.max_retries + 1):
+            try:
+                stats = write_rows(table, rows, symbols)
+                if stats:
+                    print(f"✅ {STORAGE_LABEL} (write-behind): {table} → {_sync_summary(stats)}.")
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print(f"❌ Error escribiendo {len(rows)} filas en {table} tras {attempt + 1} intentos: {e}")
+                    return
+                time.sleep(self.backoff * 2 ** attempt)
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_write_queue():
+    """Process-wide WriteBehindQueue (created lazily, drained at exit)."""
+    global _queue
+    if _queue is None or _queue.closed:
+        with _queue_lock:
+            if _queue is None or _queue.closed:
+                _queue = WriteBehindQueue()
+                atexit.register(_queue.close)
+    return _queue
+
+# ── Writers por tabla ────────────────────────────────────────────────────
+def insert_sentiment(data_list):
+    storage = get_storage()
+    if not storage or not data_list: return
     try:
-        response = client.table("sentiment_analysis").insert(data_list).execute()
-        print(f"✅ Supabase: Insertados {len(data_list)} registros de sentimiento.")
+        storage.insert("sentiment_analysis", data_list)
+        print(f"✅ {STORAGE_LABEL}: Insertados {len(data_list)} registros de sentimiento.")
     except Exception as e:
         print(f"❌ Error insertando en sentiment_analysis: {e}")
 
-def insert_sr_levels(data_list):
-    client = get_supabase_client()
-    if not client or not data_list: return
+def insert_sr_levels(data_list, symbols=None):
+    """Sync S/R levels of every symbol in the batch (plus `symbols` scanned with no levels)."""
     try:
-        # Clean stale data for this symbol before inserting fresh
-        symbol = data_list[0].get('symbol')
-        if symbol:
-            client.table("support_resistance_levels").delete().eq('symbol', symbol).execute()
-        response = client.table("support_resistance_levels").insert(data_list).execute()
-        print(f"✅ Supabase: Insertados {len(data_list)} muros (Soporte/Resistencia).")
+        stats = sync_rows("support_resistance_levels", data_list, symbols)
+        if stats:
+            print(f"✅ {STORAGE_LABEL}: Muros (Soporte/Resistencia) → {_sync_summary(stats)}.")
     except Exception as e:
         print(f"❌ Error insertando en support_resistance_levels: {e}")
 
-def insert_rsi_divergences(data_list):
-    client = get_supabase_client()
-    if not client or not data_list: return
+def insert_rsi_divergences(data_list, symbols=None):
     try:
-        symbol = data_list[0].get('symbol')
-        if symbol:
-            client.table("rsi_divergences").delete().eq('symbol', symbol).execute()
-        response = client.table("rsi_divergences").insert(data_list).execute()
-        print(f"✅ Supabase: Insertadas {len(data_list)} divergencias RSI.")
+        stats = sync_rows("rsi_divergences", data_list, symbols)
+        if stats:
+            print(f"✅ {STORAGE_LABEL}: Divergencias RSI → {_sync_summary(stats)}.")
     except Exception as e:
         print(f"❌ Error insertando en rsi_divergences: {e}")
 
-def insert_fvgs(data_list):
-    client = get_supabase_client()
-    if not client or not data_list: return
+def insert_fvgs(data_list, symbols=None):
     try:
-        symbol = data_list[0].get('symbol')
-        if symbol:
-            client.table("fair_value_gaps").delete().eq('symbol', symbol).execute()
-        response = client.table("fair_value_gaps").insert(data_list).execute()
-        print(f"✅ Supabase: Insertados {len(data_list)} FVGs.")
+        stats = sync_rows("fair_value_gaps", data_list, symbols)
+        if stats:
+            print(f"✅ {STORAGE_LABEL}: FVGs → {_sync_summary(stats)}.")
     except Exception as e:
         print(f"❌ Error insertando en fair_value_gaps: {e}")
 
 def insert_trade_confluences(data_list):
     """Confluences are KEPT for backtesting — no cleanup here."""
-    client = get_supabase_client()
-    if not client or not data_list: return
+    storage = get_storage()
+    if not storage or not data_list: return
     try:
-        response = client.table("trade_confluences").insert(data_list).execute()
-        print(f"✅ Supabase: Insertadas {len(data_list)} CONFLUENCIAS (acumuladas para backtesting).")
+        storage.insert("trade_confluences", data_list)
+        print(f"✅ {STORAGE_LABEL}: Insertadas {len(data_list)} CONFLUENCIAS (acumuladas para backtesting).")
     except Exception as e:
         print(f"❌ Error insertando en trade_confluences: {e}")
@@ -0,0 +1,258 @@
+"""
+indicators.py — Librería única de indicadores técnicos (kernels NumPy).
+
+Todos los escáneres, los dos builders de sentimiento y los motores de
+backtesting importan de aquí. Cada función acepta un pd.Series (devuelve
+un Series con el mismo índice) o un array NumPy (devuelve un array).
+
+Las fórmulas replican exactamente las versiones pandas que reemplazan:
+  RSI   → Wilder RMA = ewm(com=period-1, min_periods=period, adjust=True)
+  EMA   → ewm(span, adjust=False)
+  ATR   → media simple del True Range (así lo calculaba todo el repo)
+  OBV   → suma acumulada del volumen con el signo del cambio de cierre
+Las recursiones exponenciales se resuelven con scipy.signal.lfilter y las
+ventanas móviles con sliding_window_view, sin bucles en Python.
+
+Para el motor en vivo hay además versiones Streaming* que avanzan una vela
+por llamada en O(1) y dan los mismos valores que las vectorizadas.
+"""
+
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
+
+# Period of the precomputed `rsi` / `atr` columns
+INDICATOR_PERIOD = 14
+
+
+def _values(x):
+    return np.asarray(x, dtype=np.float64)
+
+
+def _like(result, x):
+    """Return `result` as a Series aligned to `x` when the input was a Series."""
+    if isinstance(x, pd.Series):
+        return pd.Series(result, index=x.index)
+    return result
+
+
+def _windows(values, period, reducer, **kwargs):
+    """Apply `reducer` over every full `period` window; leading slots are NaN."""
+    out = np.full(len(values), np.nan)
+    if len(values) >= period:
+        out[period - 1:] = reducer(sliding_window_view(values, period), axis=1, **kwargs)
+    return out
+
+
+# ── Kernels ───────────────────────────────────────────────────
+def sma(x, period):
+    return _like(_windows(_values(x), period, np.mean), x)
+
+
+def rolling_min(x, period):
+    return _like(_windows(_values(x), period, np.min), x)
+
+
+def rolling_max(x, period):
+    return _like(_windows(_values(x), period, np.max), x)
+
+
+def rolling_std(x, period):
+    """Sample standard deviation (ddof=1), like pandas rolling().std()."""
+    return _like(_windows(_values(x), period, np.std, ddof=1), x)
+
+
+def ema(x, span):
+    """Exponential moving average seeded with the first value (adjust=False)."""
+    values = _values(x)
+    if len(values) == 0:
+        return _like(values, x)
+    alpha = 2.0 / (span + 1.0)
+    out, _ = lfilter([alpha], [1.0, alpha - 1.0], values, zi=[(1.0 - alpha) * values[0]])
+    return _like(out, x)
+
+
+def rma(x, period):
+    """
+    Wilder's moving average as pandas computes ewm(com=period-1,
+    min_periods=period, adjust=True): a decayed sum divided by the decayed
+    weight total, NaN until `period` observations.
+    """
+    values = _values(x)
+    decay = 1.0 - 1.0 / period
+    # Same recursion for the running sum of values and of weights
+    weighted = lfilter([1.0], [1.0, -decay], values)
+    weights = lfilter([1.0], [1.0, -decay], np.ones_like(values))
+    out = weighted / weights
+    out[:period - 1] = np.nan
+    return _like(out, x)
+
+
+def true_range(high, low, close):
+    high, low, close = _values(high), _values(low), _values(close)
+    prev_close = np.empty_like(close)
+    prev_close[0] = np.nan
+    prev_close[1:] = close[:-1]
+    # fmax skips the NaN of the first bar, leaving high - low
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return tr
+
+
+# ── Indicators ────────────────────────────────────────────────
+def calculate_rsi(series, period=14):
+    """RSI using Wilder's RMA (matches TradingView / industry standard)."""
+    close = _values(series)
+    delta = np.empty_like(close)
+    delta[0] = 0.0
+    delta[1:] = np.diff(close)
+    avg_gain = rma(np.where(delta > 0, delta, 0.0), period)
+    avg_loss = rma(np.where(delta < 0, -delta, 0.0), period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = avg_gain / avg_loss
+        rsi = 100 - (100 / (1 + rs))
+    return _like(rsi, series)
+
+
+def calculate_macd(close, fast=12, slow=26, signal=9):
+    macd_line = _values(ema(_values(close), fast)) - _values(ema(_values(close), slow))
+    signal_line = ema(macd_line, signal)
+    return _like(macd_line, close), _like(signal_line, close), _like(macd_line - signal_line, close)
+
+
+def calculate_stochastic(df, k_period=14, d_period=3):
+    low_min = rolling_min(df['low'].to_numpy(dtype=np.float64), k_period)
+    high_max = rolling_max(df['high'].to_numpy(dtype=np.float64), k_period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k = 100 * (df['close'].to_numpy(dtype=np.float64) - low_min) / (high_max - low_min)
+    d = sma(k, d_period)
+    return _like(k, df['close']), _like(d, df['close'])
+
+
+def calculate_bollinger(close, period=20, std_dev=2):
+    mid = sma(_values(close), period)
+    std = rolling_std(_values(close), period)
+    return _like(mid + std * std_dev, close), _like(mid, close), _like(mid - std * std_dev, close)
+
+
+def calculate_obv(close, volume):
+    """On-balance volume: cumulative volume signed by the close-to-close change."""
+    c = _values(close)
+    signed = np.zeros(len(c))
+    signed[1:] = np.sign(np.diff(c)) * _values(volume)[1:]
+    return _like(np.cumsum(signed), close)
+
+
+def calculate_atr(df, period=14):
+    """Simple moving average of the True Range."""
+    tr = true_range(df['high'], df['low'], df['close'])
+    return _like(sma(tr, period), df['close'])
+
+
+def calculate_atr_pct(df, period=14):
+    """
+    Latest ATR as a fraction of the latest close. A precomputed ATR(14)
+    `atr` column (add_indicator_columns, live buffers) is read instead of
+    recomputing the whole series.
+    """
+    if period == INDICATOR_PERIOD and 'atr' in df.columns:
+        atr = df['atr']
+    else:
+        atr = calculate_atr(df, period)
+    return float(np.asarray(atr)[-1] / np.asarray(df['close'], dtype=np.float64)[-1])
+
+
+def add_indicator_columns(df):
+    """
+    Add causal `rsi` and `atr` (period INDICATOR_PERIOD) columns in place.
+    Each value depends only on earlier candles, so any prefix slice
+    df.iloc[:i] carries exactly what the indicator would compute on it.
+    """
+    df['rsi'] = calculate_rsi(df['close'], period=INDICATOR_PERIOD)
+    df['atr'] = calculate_atr(df, period=INDICATOR_PERIOD)
+    return df
+
+
+# ── Streaming updaters ────────────────────────────────────────
+# One bar per update() call, O(1) each. Fed the same bars from the start of
+# a series they reproduce the vectorized functions above (same recursions).
+class StreamingEMA:
+    """EMA(span) advanced one value at a time, like ema()."""
+
+    def __init__(self, span):
+        self.alpha = 2.0 / (span + 1.0)
+        self.value = np.nan
+
+    def update(self, x):
+        x = float(x)
+        if np.isnan(self.value):
+            self.value = x
+        else:
+            self.value = self.alpha * x + (1.0 - self.alpha) * self.value
+        return self.value
+
+
+class StreamingRMA:
+    """Wilder's RMA advanced one value at a time, like rma()."""
+
+    def __init__(self, period):
+        self.period = period
+        self.decay = 1.0 - 1.0 / period
+        self.count = 0
+        self.value = np.nan
+        self._sum = 0.0
+        self._weight = 0.0
+
+    def update(self, x):
+        self._sum = float(x) + self.decay * self._sum
+        self._weight = 1.0 + self.decay * self._weight
+        self.count += 1
+        self.value = self._sum / self._weight if self.count >= self.period else np.nan
+        return self.value
+
+
+class StreamingRSI:
+    """RSI fed one close at a time, like calculate_rsi()."""
+
+    def __init__(self, period=14):
+        self._gain = StreamingRMA(period)
+        self._loss = StreamingRMA(period)
+        self._prev_close = None
+        self.value = np.nan
+
+    def update(self, close):
+        close = float(close)
+        delta = 0.0 if self._prev_close is None else close - self._prev_close
+        self._prev_close = close
+        avg_gain = self._gain.update(delta if delta > 0 else 0.0)
+        avg_loss = self._loss.update(-delta if delta < 0 else 0.0)
+        if np.isnan(avg_gain) or np.isnan(avg_loss):
+            self.value = np.nan
+        elif avg_loss == 0:
+            self.value = 100.0 if avg_gain > 0 else np.nan
+        else:
+            self.value = 100 - (100 / (1 + avg_gain / avg_loss))
+        return self.value
+
+
+class StreamingATR:
+    """ATR (simple average of the last `period` true ranges), like calculate_atr()."""
+
+    def __init__(self, period=14):
+        self.period = period
+        self._ranges = deque(maxlen=period)
+        self._prev_close = None
+        self.value = np.nan
+
+    def update(self, high, low, close):
+        high, low, close = float(high), float(low), float(close)
+        if self._prev_close is None:
+            tr = high - low
+        else:
+            tr = max(high - low, abs(high - self._prev_close), abs(low - self._prev_close))
+        self._prev_close = close
+        self._ranges.append(tr)
+        self.value = sum(self._ranges) / self.period if len(self._ranges) == self.period else np.nan
+        return self.value
@@ -0,0 +1,105 @@
+"""
+llm_cache.py — Caché persistente (SQLite) de respuestas de chat.completions.
+
+La clave es un digest de: modelo, temperatura, el texto exacto del prompt y
+los inputs estructurados (indicadores, titulares) tal cual. Sólo si entre
+dos corridas el prompt es idéntico se reutiliza la respuesta sin llamar a
+la API: la respuesta cita precios y niveles del prompt, así que dos estados
+de mercado distintos nunca comparten entrada.
+
+Las entradas vencen a los LLM_CACHE_TTL segundos y la tabla se recorta a
+LLM_CACHE_MAX_ENTRIES filas (las más antiguas primero).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", os.path.join(ROOT_DIR, '.cache', 'llm.sqlite'))
+
+# Seconds a response can be reused for identical inputs
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", 2 * 60 * 60))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 500))
+
+
+def _connect():
+    os.makedirs(os.path.dirname(LLM_CACHE_PATH), exist_ok=True)
+    conn = sqlite3.connect(LLM_CACHE_PATH, timeout=10)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS responses ("
+        " key TEXT PRIMARY KEY, model TEXT, created_at REAL, content TEXT)"
+    )
+    return conn
+
+
+def cache_key(model, temperature, prompt, inputs):
+    material = {
+        'model': model,
+        'temperature': temperature,
+        # Exact text: the answer quotes the prices and levels it was given
+        'prompt': prompt,
+        'inputs': inputs,
+    }
+    # default=str: NumPy scalars and timestamps serialize at full precision
+    blob = json.dumps(material, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+def lookup(key, ttl=None):
+    ttl = LLM_CACHE_TTL if ttl is None else ttl
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT created_at, content FROM responses WHERE key = ?", (key,)).fetchone()
+    if row and time.time() - row[0] < ttl:
+        return row[1]
+    return None
+
+
+def store(key, model, content):
+    now = time.time()
+    with closing(_connect()) as conn, conn:
+        conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, model, now, content))
+        # Eviction: expired rows, then the oldest beyond the size cap
+        conn.execute("DELETE FROM responses WHERE created_at < ?", (now - LLM_CACHE_TTL,))
+        conn.execute(
+            "DELETE FROM responses WHERE key NOT IN "
+            "(SELECT key FROM responses ORDER BY created_at DESC LIMIT ?)", (LLM_CACHE_MAX_ENTRIES,)
+        )
+
+
+def complete_json(client, prompt, inputs, model="gpt-4o-mini", temperature=0.1, ttl=None, timeout=None):
+    """
+    JSON-mode chat completion for `prompt`, served from the cache when
+    `inputs` (indicators, headlines...) match a recent call. Returns the
+    response content string. `timeout` (seconds) bounds the API request.
+    """
+    key = cache_key(model, temperature, prompt, inputs)
+    try:
+        cached = lookup(key, ttl)
+    except sqlite3.Error as e:
+        print(f"  ⚠️ Caché LLM no disponible: {e}")
+        cached = None
+    if cached is not None:
+        print("  ♻️ Respuesta IA desde caché (inputs sin cambios)")
+        return cached
+
+    kwargs = {'timeout': timeout} if timeout is not None else {}
+    response = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        response_format={"type": "json_object"},
+        temperature=temperature,
+        **kwargs
+    )
+    content = response.choices[0].message.content
+
+    # Only well-formed answers are worth reusing
+    try:
+        json.loads(content)
+        store(key, model, content)
+    except (ValueError, sqlite3.Error):
+        pass
+    return content
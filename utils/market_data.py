@@ -0,0 +1,112 @@
+"""
+market_data.py — Cliente único de datos de mercado (Binance vía ccxt) por proceso.
+
+Todos los módulos comparten la misma instancia de ccxt.binance: una sola
+sesión HTTP (keep-alive), un solo load_markets y un único presupuesto de
+request-weight (token bucket) para que escáneres en paralelo no se pisen
+con 429s. Los errores de red se reintentan con backoff exponencial.
+"""
+
+import threading
+import time
+
+import ccxt
+
+from utils.rate_limiter import (
+    binance_bucket,
+    WEIGHT_KLINES,
+    WEIGHT_TICKER_ONE,
+    WEIGHT_TICKER_ALL,
+    WEIGHT_EXCHANGE_INFO,
+)
+
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0     # seconds, doubled on every retry
+REQUEST_TIMEOUT_MS = 15000
+
+
+def _tickers_weight(symbols):
+    """Binance GET /ticker/24hr weight depends on how many symbols are asked for."""
+    if not symbols or len(symbols) > 100:
+        return WEIGHT_TICKER_ALL
+    if len(symbols) > 20:
+        return 40
+    return WEIGHT_TICKER_ONE
+
+
+class MarketDataClient:
+    """Process-wide Binance client with pooled connections, retries and a weight budget."""
+
+    def __init__(self, exchange=None, limiter=None):
+        # ccxt's per-instance limiter just sleeps; pacing is done by the shared bucket
+        self.exchange = exchange or ccxt.binance({'enableRateLimit': False, 'timeout': REQUEST_TIMEOUT_MS})
+        self.limiter = limiter or binance_bucket()
+        self._markets_lock = threading.Lock()
+        self._markets_loaded = False
+
+    # ── Plumbing ──────────────────────────────────────────
+    def _call(self, weight, fn, *args, **kwargs):
+        """Take `weight` from the budget, call `fn`, retry network errors with backoff."""
+        for attempt in range(MAX_RETRIES + 1):
+            self.limiter.acquire(weight)
+            try:
+                return fn(*args, **kwargs)
+            except ccxt.DDoSProtection:
+                # 429/418: stall every caller sharing this budget, not just this one
+                if attempt == MAX_RETRIES:
+                    raise
+                self.limiter.penalize(BACKOFF_BASE * 2 ** (attempt + 2))
+            except ccxt.NetworkError:
+                if attempt == MAX_RETRIES:
+                    raise
+                time.sleep(BACKOFF_BASE * 2 ** attempt)
+
+    def load_markets(self):
+        if self._markets_loaded:
+            return self.exchange.markets
+        with self._markets_lock:
+            if not self._markets_loaded:
+                self._call(WEIGHT_EXCHANGE_INFO, self.exchange.load_markets)
+                self._markets_loaded = True
+        return self.exchange.markets
+
+    # ── ccxt-compatible helpers (used by utils.ohlcv_cache) ──
+    def parse_timeframe(self, timeframe):
+        return self.exchange.parse_timeframe(timeframe)
+
+    def milliseconds(self):
+        return self.exchange.milliseconds()
+
+    # ── Market data ───────────────────────────────────────
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None):
+        self.load_markets()
+        return self._call(WEIGHT_KLINES, self.exchange.fetch_ohlcv, symbol,
+                          timeframe=timeframe, since=since, limit=limit)
+
+    def fetch_ticker(self, symbol):
+        self.load_markets()
+        return self._call(WEIGHT_TICKER_ONE, self.exchange.fetch_ticker, symbol)
+
+    def fetch_tickers(self, symbols=None):
+        """All tickers (or a subset) in a single request."""
+        self.load_markets()
+        return self._call(_tickers_weight(symbols), self.exchange.fetch_tickers, symbols)
+
+    def fetch_prices(self, symbols):
+        """{symbol: last price} for every symbol with one batched ticker call."""
+        tickers = self.fetch_tickers(list(symbols))
+        return {s: tickers[s]['last'] for s in symbols if s in tickers and tickers[s].get('last') is not None}
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_market_data_client():
+    """Return the process-wide MarketDataClient (created lazily)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MarketDataClient()
+    return _client
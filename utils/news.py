@@ -0,0 +1,105 @@
+"""
+news.py — Titulares de Google News con caché compartido por consulta.
+
+Cada consulta guarda en NEWS_CACHE_DIR un JSON con los titulares ya
+parseados más el ETag / Last-Modified del feed. Dentro de NEWS_CACHE_TTL
+segundos se sirve desde disco sin tocar la red; pasado ese tiempo se
+revalida con un GET condicional (304 → se reutilizan los titulares).
+Si el feed falla o tarda más de NEWS_TIMEOUT se devuelven los últimos
+titulares guardados, aunque estén vencidos.
+"""
+
+import hashlib
+import json
+import os
+import time
+import xml.etree.ElementTree as ET
+
+import requests
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NEWS_CACHE_DIR = os.environ.get("NEWS_CACHE_DIR", os.path.join(ROOT_DIR, '.cache', 'news'))
+
+# Seconds a query's headlines are served without revalidating
+NEWS_CACHE_TTL = float(os.environ.get("NEWS_CACHE_TTL", 300))
+# Connect/read timeout for the RSS request, in seconds
+NEWS_TIMEOUT = float(os.environ.get("NEWS_TIMEOUT", 10))
+
+NO_NEWS = ["Sin noticias relevantes."]
+NEWS_ERROR = ["Error obteniendo noticias."]
+
+_session = requests.Session()
+_session.headers.update({'User-Agent': 'Mozilla/5.0'})
+
+
+def news_url(query):
+    q = query.replace(' ', '+')
+    return f"https://news.google.com/rss/search?q={q}+crypto+market&hl=en-US&gl=US&ceid=US:en"
+
+
+def cache_path(query):
+    digest = hashlib.sha1(query.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(NEWS_CACHE_DIR, f"{digest}.json")
+
+
+def _load(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def _save(entry, path):
+    """Write atomically so concurrent readers never see a half-written file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, path)
+
+
+def parse_headlines(xml_data):
+    root = ET.fromstring(xml_data)
+    return [item.findtext('title') for item in root.findall('.//item') if item.findtext('title')]
+
+
+def get_news(query, limit=7, ttl=None):
+    """Latest `limit` headlines for `query`, cached for `ttl` seconds (default NEWS_CACHE_TTL)."""
+    ttl = NEWS_CACHE_TTL if ttl is None else ttl
+    path = cache_path(query)
+    cached = _load(path)
+
+    if cached and time.time() - cached.get('fetched_at', 0) < ttl:
+        return cached['headlines'][:limit] or NO_NEWS
+
+    headers = {}
+    if cached:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    try:
+        resp = _session.get(news_url(query), headers=headers, timeout=NEWS_TIMEOUT)
+        if resp.status_code == 304 and cached:
+            cached['fetched_at'] = time.time()
+            _save(cached, path)
+            return cached['headlines'][:limit] or NO_NEWS
+        resp.raise_for_status()
+        entry = {
+            'query': query,
+            'headlines': parse_headlines(resp.content),
+            'etag': resp.headers.get('ETag'),
+            'last_modified': resp.headers.get('Last-Modified'),
+            'fetched_at': time.time(),
+        }
+    except (requests.RequestException, ET.ParseError) as e:
+        print(f"  ⚠️ Noticias '{query}': {e}")
+        # A stale copy beats no context at all
+        return cached['headlines'][:limit] if cached and cached['headlines'] else NEWS_ERROR
+
+    _save(entry, path)
+    return entry['headlines'][:limit] or NO_NEWS
@@ -0,0 +1,160 @@
+"""
+ohlcv_cache.py — Caché local de velas OHLCV compartido por todos los escáneres.
+
+Cada (símbolo, temporalidad) vive en un CSV bajo CACHE_DIR. Una lectura sólo
+descarga las velas posteriores al último cierre guardado (la última vela se
+vuelve a pedir porque puede seguir formándose) y sirve el resto desde disco.
+Si el archivo se refrescó hace menos de CACHE_TTL segundos no se toca la red.
+
+Cuando el exchange devuelve menos velas de las pedidas (1w, o pares recién
+listados) la serie ya es el historial completo: se marca con un archivo
+`.complete` junto al CSV y cuenta como suficiente aunque tenga menos de
+`limit` velas.
+
+Dentro de un proceso cada (símbolo, temporalidad) se refresca bajo su propio
+lock, así que dos hilos que piden la misma serie no la descargan dos veces
+ni escriben el mismo archivo a la vez.
+"""
+
+import os
+import time
+import tempfile
+import threading
+
+import pandas as pd
+
+from utils.market_data import get_market_data_client
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.environ.get("OHLCV_CACHE_DIR", os.path.join(ROOT_DIR, '.cache', 'ohlcv'))
+
+# Seconds a cached series is considered fresh enough to skip the exchange
+CACHE_TTL = float(os.environ.get("OHLCV_CACHE_TTL", 60))
+
+# Upper bound of candles kept on disk per (symbol, TF)
+MAX_CACHED_CANDLES = 5000
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+BINANCE_MAX_LIMIT = 1000
+
+# One lock per cache file, created on first use
+_path_locks = {}
+_path_locks_lock = threading.Lock()
+
+
+def cache_path(symbol, timeframe):
+    safe_symbol = symbol.replace('/', '').replace(':', '_')
+    return os.path.join(CACHE_DIR, safe_symbol, f"{timeframe}.csv")
+
+
+def _path_lock(path):
+    with _path_locks_lock:
+        return _path_locks.setdefault(path, threading.Lock())
+
+
+def _complete_path(path):
+    return os.path.splitext(path)[0] + '.complete'
+
+
+def _set_complete(path, complete):
+    """Flag (or unflag) the cached series as the exchange's whole history."""
+    marker = _complete_path(path)
+    if complete:
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        open(marker, 'w').close()
+    elif os.path.exists(marker):
+        os.remove(marker)
+
+
+def _load(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        return pd.read_csv(path)
+    except Exception:
+        return None
+
+
+def _save(df, path):
+    """Write atomically so concurrent readers never see a half-written file."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Unique per write: threads of one process must not share a temp file
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', newline='') as f:
+            df.to_csv(f, index=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _merge(cached, bars):
+    fresh = pd.DataFrame(bars, columns=OHLCV_COLUMNS)
+    if cached is None or cached.empty:
+        merged = fresh
+    else:
+        merged = pd.concat([cached, fresh], ignore_index=True)
+    # keep='last' so a re-fetched forming candle replaces its stale copy
+    merged = merged.drop_duplicates(subset='timestamp', keep='last')
+    merged = merged.sort_values('timestamp').reset_index(drop=True)
+    return merged.iloc[-MAX_CACHED_CANDLES:].reset_index(drop=True)
+
+
+def _fetch_tail(exchange, symbol, timeframe, since):
+    """Download every bar from `since` (inclusive) up to now, paginating."""
+    tf_ms = exchange.parse_timeframe(timeframe) * 1000
+    bars = []
+    while True:
+        chunk = exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=BINANCE_MAX_LIMIT)
+        if not chunk:
+            break
+        bars.extend(chunk)
+        if len(chunk) < BINANCE_MAX_LIMIT:
+            break
+        since = chunk[-1][0] + tf_ms
+    return bars
+
+
+def get_ohlcv(symbol, timeframe, limit=1000, exchange=None):
+    """
+    Return the last `limit` candles for (symbol, timeframe) as a DataFrame
+    with raw millisecond timestamps, refreshing the on-disk cache incrementally.
+    """
+    exchange = exchange or get_market_data_client()
+    path = cache_path(symbol, timeframe)
+    with _path_lock(path):
+        return _refresh(exchange, symbol, timeframe, limit, path)
+
+
+def _refresh(exchange, symbol, timeframe, limit, path):
+    """get_ohlcv body; runs under the path's lock."""
+    cached = _load(path)
+
+    has_enough = cached is not None and (len(cached) >= limit or os.path.exists(_complete_path(path)))
+    if has_enough and time.time() - os.path.getmtime(path) < CACHE_TTL:
+        return cached.iloc[-limit:].reset_index(drop=True)
+
+    if has_enough:
+        tf_ms = exchange.parse_timeframe(timeframe) * 1000
+        last_ts = int(cached['timestamp'].iloc[-1])
+        missing = (exchange.milliseconds() - last_ts) // tf_ms
+        if missing < MAX_CACHED_CANDLES:
+            bars = _fetch_tail(exchange, symbol, timeframe, since=last_ts)
+        else:
+            # Too stale to bridge the gap: start over from the latest bars
+            cached = None
+            bars = exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
+            _set_complete(path, len(bars) < min(limit, BINANCE_MAX_LIMIT))
+    else:
+        # Cold (or too short) cache: one plain request for the latest bars
+        bars = exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
+        if cached is not None and len(cached) and bars and cached['timestamp'].iloc[-1] < bars[0][0]:
+            cached = None  # Old rows would leave a hole before the new ones
+        # A short answer means there is no older history to ask for
+        _set_complete(path, len(bars) < min(limit, BINANCE_MAX_LIMIT))
+
+    df = _merge(cached, bars)
+    _save(df, path)
+    return df.iloc[-limit:].reset_index(drop=True)
@@ -0,0 +1,206 @@
+"""
+pivots.py — Detector de pivotes fractales (máximos/mínimos) en streaming.
+
+Un pivote de orden k en la vela i es el máximo (o mínimo) de la ventana
+[i-k, i+k], así que sólo se confirma k velas después de formarse. El
+detector recibe una vela por llamada y mantiene el máximo/mínimo de la
+ventana con una deque monótona, O(1) amortizado por vela.
+
+Para dar los mismos índices que scipy.signal.argrelextrema(order=k) sobre
+la serie completa, las últimas k velas (aún sin confirmar) se evalúan como
+lo hace argrelextrema en el borde: contra la ventana recortada al final.
+Lo mismo pasa al inicio de un buffer que descartó sus velas más viejas:
+argrelextrema evalúa sus primeras k velas contra la ventana recortada al
+principio, así que head_pivots() las reevalúa sobre el buffer.
+
+PivotTimeline es la versión para backtests: calcula todos los pivotes de la
+serie completa una sola vez con su vela de confirmación, y responde qué
+pivotes vería argrelextrema sobre las velas cerradas hasta t (o sobre las
+primeras L velas) con una búsqueda binaria más la evaluación de la cola de
+k velas.
+"""
+
+from bisect import bisect_left
+from collections import deque
+
+import numpy as np
+from scipy.signal import argrelextrema
+
+
+class _WindowExtreme:
+    """Sliding-window max (or min, with `sign=-1`) over the last `size` values."""
+
+    def __init__(self, size, sign=1):
+        self.size = size
+        self.sign = sign
+        self._deque = deque()   # (idx, sign*value), non-increasing values
+        self._last_nan = None
+
+    def push(self, idx, value):
+        if np.isnan(value):
+            # argrelextrema never marks a pivot whose window holds a NaN
+            self._last_nan = idx
+        else:
+            v = self.sign * value
+            while self._deque and self._deque[-1][1] < v:
+                self._deque.pop()
+            self._deque.append((idx, v))
+        while self._deque and self._deque[0][0] <= idx - self.size:
+            self._deque.popleft()
+
+    def is_extreme(self, value, now):
+        """Whether `value` is the extreme of the window ending at bar `now`."""
+        if np.isnan(value) or (self._last_nan is not None and self._last_nan > now - self.size):
+            return False
+        return self.sign * value >= self._deque[0][1]
+
+
+class StreamingPivotDetector:
+    """
+    Fractal highs/lows of `order` fed one candle at a time.
+
+    Confirmed pivots are kept as (idx, price, time, confirmed_at) tuples in
+    `highs` / `lows`, with `idx` counted from the first candle fed.
+    """
+
+    def __init__(self, order):
+        self.order = order
+        self.count = 0
+        self.highs = []
+        self.lows = []
+        self._max = _WindowExtreme(2 * order + 1, sign=1)
+        self._min = _WindowExtreme(2 * order + 1, sign=-1)
+        # Last 2k+1 candles: the pending pivot and its window
+        self._recent = deque(maxlen=2 * order + 1)
+
+    def update(self, high, low, timestamp):
+        """
+        Ingest one closed candle. Returns the pivots it confirms, as
+        [('high' | 'low', idx, price, time), ...].
+        """
+        high, low = float(high), float(low)
+        now = self.count
+        self._max.push(now, high)
+        self._min.push(now, low)
+        self._recent.append((high, low, timestamp))
+        self.count += 1
+
+        confirmed = []
+        i = now - self.order
+        if i >= 0:
+            cand_high, cand_low, cand_time = self._recent[-self.order - 1]
+            if self._max.is_extreme(cand_high, now):
+                self.highs.append((i, cand_high, cand_time, timestamp))
+                confirmed.append(('high', i, cand_high, cand_time))
+            if self._min.is_extreme(cand_low, now):
+                self.lows.append((i, cand_low, cand_time, timestamp))
+                confirmed.append(('low', i, cand_low, cand_time))
+        return confirmed
+
+    def feed(self, df):
+        """Ingest every row of `df` (e.g. a warmup buffer)."""
+        for high, low, ts in zip(df['high'].to_numpy(dtype=np.float64),
+                                 df['low'].to_numpy(dtype=np.float64),
+                                 list(df['timestamp'])):
+            self.update(high, low, ts)
+
+    def _pending(self, column, better_or_equal):
+        """Unconfirmed tail bars that argrelextrema would mark at the current end."""
+        values = [bar[column] for bar in self._recent]
+        first = self.count - len(values)
+        found = []
+        for i in range(max(0, self.count - self.order), self.count):
+            pos = i - first
+            window = values[max(0, pos - self.order):]
+            if all(better_or_equal(values[pos], v) for v in window):
+                found.append(i)
+        return found
+
+    def pivot_indices(self, start=0, include_pending=True):
+        """
+        (max_idx, min_idx) arrays of pivots at or after candle `start`,
+        like argrelextrema over the candles fed so far. Subtract `start`
+        to get positions in a buffer that holds candles [start, count).
+        """
+        max_idx = [p[0] for p in self.highs[bisect_left(self.highs, (start,)):]]
+        min_idx = [p[0] for p in self.lows[bisect_left(self.lows, (start,)):]]
+        if include_pending:
+            max_idx += [i for i in self._pending(0, lambda a, b: a >= b) if i >= start]
+            min_idx += [i for i in self._pending(1, lambda a, b: a <= b) if i >= start]
+        return np.asarray(max_idx, dtype=np.int64), np.asarray(min_idx, dtype=np.int64)
+
+
+def head_pivots(values, order, better_or_equal):
+    """
+    Positions among the first `order` of `values` that argrelextrema marks,
+    i.e. extremes of their window truncated at the start of the array.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    head = range(min(order, len(values)))
+    return np.asarray([i for i in head
+                       if np.all(better_or_equal(values[i], values[:i + order + 1]))], dtype=np.int64)
+
+
+class PivotTimeline:
+    """
+    Pivots of a whole series indexed by confirmation time, for look-ahead-free
+    backtests. visible(t) returns exactly what argrelextrema(order) finds on
+    the prefix of candles with timestamp <= t.
+
+    `positions` optionally maps series positions to positions in another
+    frame (e.g. a series with rows dropped) and is applied to the result.
+    """
+
+    def __init__(self, high, low, timestamps, order, positions=None):
+        self.order = order
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.timestamps = np.asarray(timestamps)
+        self.positions = positions
+        n = len(self.high)
+
+        # Pivots whose whole window exists are final from bar idx+order on;
+        # the last `order` bars are re-evaluated per query as the tail
+        max_idx = argrelextrema(self.high, np.greater_equal, order=order)[0]
+        min_idx = argrelextrema(self.low, np.less_equal, order=order)[0]
+        self.max_idx = max_idx[max_idx + order < n]
+        self.min_idx = min_idx[min_idx + order < n]
+
+    def _tail(self, values, length, extreme, better_or_equal):
+        """Bars of the prefix's last `order` that are extremes of their truncated window."""
+        start = max(0, length - 2 * self.order)
+        segment = values[start:length]
+        if len(segment) == 0:
+            return np.empty(0, dtype=np.int64)
+        # Extreme of [j, length) for every j of the segment
+        suffix = extreme.accumulate(segment[::-1])[::-1]
+        tail = np.arange(max(0, length - self.order), length)
+        window_start = np.maximum(tail - self.order, 0) - start
+        return tail[better_or_equal(values[tail], suffix[window_start])]
+
+    def visible(self, current_time):
+        """(max_pos, min_pos) of the pivots argrelextrema finds on candles up to `current_time`."""
+        length = int(np.searchsorted(self.timestamps, current_time, side='right'))
+        return self._prefix(length)
+
+    def visible_prefix(self, length):
+        """
+        Same as visible() for the first `length` rows of the frame the
+        result refers to (e.g. a precomputed as-of alignment), with no
+        timestamp search.
+        """
+        if self.positions is not None:
+            length = int(np.searchsorted(self.positions, length))
+        return self._prefix(length)
+
+    def _prefix(self, length):
+        # A pivot at idx is confirmed by bar idx+order, i.e. inside the prefix
+        n_max = np.searchsorted(self.max_idx, length - self.order)
+        n_min = np.searchsorted(self.min_idx, length - self.order)
+        max_pos = np.concatenate([self.max_idx[:n_max],
+                                  self._tail(self.high, length, np.maximum, np.greater_equal)])
+        min_pos = np.concatenate([self.min_idx[:n_min],
+                                  self._tail(self.low, length, np.minimum, np.less_equal)])
+        if self.positions is not None:
+            return self.positions[max_pos], self.positions[min_pos]
+        return max_pos, min_pos
@@ -0,0 +1,61 @@
+"""
+rate_limiter.py — Token bucket thread-safe para repartir el presupuesto de
+request-weight de Binance entre hilos en lugar de usar sleeps fijos.
+
+Binance mide el consumo por IP en "weight" por minuto (REQUEST_WEIGHT).
+Cada request descuenta su peso del bucket; si no hay tokens suficientes el
+hilo espera exactamente lo necesario para que se rellenen.
+"""
+
+import threading
+import time
+
+# Binance spot REQUEST_WEIGHT limit per minute and the share we allow ourselves
+BINANCE_WEIGHT_PER_MINUTE = 6000
+BINANCE_WEIGHT_SAFETY = 0.8
+
+# Request weights of the endpoints we use (GET /api/v3/...)
+WEIGHT_KLINES = 2
+WEIGHT_TICKER_ONE = 2
+WEIGHT_TICKER_ALL = 80
+WEIGHT_EXCHANGE_INFO = 20
+
+
+class TokenBucket:
+    """`capacity` tokens refilled continuously at `rate` tokens per second."""
+
+    def __init__(self, capacity, rate):
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available, then consume them."""
+        tokens = min(float(tokens), self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def penalize(self, seconds):
+        """Empty the bucket for `seconds` (e.g. after a 429) so every thread backs off."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+
+def binance_bucket(weight_per_minute=BINANCE_WEIGHT_PER_MINUTE, safety=BINANCE_WEIGHT_SAFETY, burst_seconds=5):
+    """Token bucket sized to Binance's per-minute weight budget."""
+    rate = weight_per_minute * safety / 60.0
+    return TokenBucket(capacity=rate * burst_seconds, rate=rate)
@@ -0,0 +1,166 @@
+"""
+storage.py — Backends de persistencia para utils/db.
+
+Los writers de utils/db sólo necesitan cuatro operaciones por tabla:
+leer las filas de unos símbolos, insertar, upsert por id y borrar por id.
+  SupabaseBackend → PostgREST remoto (requests paginados y por chunks)
+  SQLiteBackend   → archivo local, para correr offline, hacer benchmarks del
+                    orquestador o backtestear contra las confluencias guardadas
+
+Cada tabla SQLite guarda la fila completa como JSON en `data`, con `symbol`
+y `timeframe` en columnas propias indexadas por (symbol, timeframe).
+"""
+
+import abc
+import json
+import os
+import sqlite3
+import threading
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SQLITE_PATH = os.path.join(ROOT_DIR, '.data', 'quant.sqlite')
+
+# Rows per insert/upsert request and ids per delete request (URL length)
+WRITE_CHUNK = 500
+DELETE_CHUNK = 200
+# PostgREST returns at most this many rows per select
+READ_PAGE = 1000
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class StorageBackend(abc.ABC):
+    """
+    Minimal table operations the DB writers are built on. A backend missing
+    any of them fails at construction, not halfway through a sync.
+    """
+
+    @abc.abstractmethod
+    def select_by_symbols(self, table, symbols):
+        """Every row (with its `id`) whose symbol is in `symbols`."""
+
+    @abc.abstractmethod
+    def insert(self, table, rows):
+        """Append new rows."""
+
+    @abc.abstractmethod
+    def upsert(self, table, rows):
+        """Overwrite existing rows matched by their `id`."""
+
+    @abc.abstractmethod
+    def delete_ids(self, table, ids):
+        """Delete the rows with these `id`s."""
+
+
+class SupabaseBackend(StorageBackend):
+
+    def __init__(self, client):
+        self.client = client
+
+    def select_by_symbols(self, table, symbols):
+        rows = []
+        start = 0
+        while True:
+            page = (self.client.table(table).select("*").in_('symbol', list(symbols))
+                    .range(start, start + READ_PAGE - 1).execute().data)
+            rows.extend(page)
+            if len(page) < READ_PAGE:
+                return rows
+            start += READ_PAGE
+
+    def insert(self, table, rows):
+        for chunk in _chunks(rows, WRITE_CHUNK):
+            self.client.table(table).insert(chunk).execute()
+
+    def upsert(self, table, rows):
+        for chunk in _chunks(rows, WRITE_CHUNK):
+            self.client.table(table).upsert(chunk).execute()
+
+    def delete_ids(self, table, ids):
+        for chunk in _chunks(ids, DELETE_CHUNK):
+            self.client.table(table).delete().in_('id', chunk).execute()
+
+
+def _json_default(value):
+    # numpy scalars (np.int64...) and timestamps coming from the scanners
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+class SQLiteBackend(StorageBackend):
+
+    def __init__(self, path=None):
+        # Read at construction so a .env loaded by utils.db is honoured
+        path = path or os.environ.get("SQLITE_PATH", DEFAULT_SQLITE_PATH)
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._lock = threading.Lock()
+        self._tables = set()
+
+    def _ensure_table(self, table):
+        if table in self._tables:
+            return
+        self._conn.execute(
+            f'CREATE TABLE IF NOT EXISTS "{table}" ('
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " symbol TEXT, timeframe TEXT,"
+            " created_at TEXT DEFAULT CURRENT_TIMESTAMP,"
+            " data TEXT NOT NULL)"
+        )
+        self._conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_symbol_tf" ON "{table}" (symbol, timeframe)')
+        self._tables.add(table)
+
+    @staticmethod
+    def _params(row):
+        data = {k: v for k, v in row.items() if k != 'id'}
+        return row.get('symbol'), row.get('timeframe'), json.dumps(data, default=_json_default)
+
+    def select_by_symbols(self, table, symbols):
+        symbols = list(symbols)
+        if not symbols:
+            return []
+        with self._lock:
+            self._ensure_table(table)
+            marks = ','.join('?' * len(symbols))
+            cur = self._conn.execute(f'SELECT id, created_at, data FROM "{table}" WHERE symbol IN ({marks})', symbols)
+            return [{**json.loads(data), 'id': row_id, 'created_at': created_at}
+                    for row_id, created_at, data in cur.fetchall()]
+
+    def insert(self, table, rows):
+        with self._lock, self._conn:
+            self._ensure_table(table)
+            self._conn.executemany(f'INSERT INTO "{table}" (symbol, timeframe, data) VALUES (?, ?, ?)',
+                                   [self._params(r) for r in rows])
+
+    def upsert(self, table, rows):
+        with self._lock, self._conn:
+            self._ensure_table(table)
+            self._conn.executemany(f'UPDATE "{table}" SET symbol = ?, timeframe = ?, data = ? WHERE id = ?',
+                                   [(*self._params(r), r['id']) for r in rows])
+
+    def delete_ids(self, table, ids):
+        with self._lock, self._conn:
+            self._ensure_table(table)
+            self._conn.executemany(f'DELETE FROM "{table}" WHERE id = ?', [(i,) for i in ids])
+
+    def select(self, table, symbol=None, timeframe=None):
+        """Rows of `table`, optionally filtered (e.g. stored confluences for a backtest)."""
+        query, params = [], []
+        if symbol is not None:
+            query.append("symbol = ?")
+            params.append(symbol)
+        if timeframe is not None:
+            query.append("timeframe = ?")
+            params.append(timeframe)
+        where = f" WHERE {' AND '.join(query)}" if query else ""
+        with self._lock:
+            self._ensure_table(table)
+            cur = self._conn.execute(f'SELECT id, created_at, data FROM "{table}"{where} ORDER BY id', params)
+            return [{**json.loads(data), 'id': row_id, 'created_at': created_at}
+                    for row_id, created_at, data in cur.fetchall()]